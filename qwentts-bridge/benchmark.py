@@ -0,0 +1,535 @@
+"""
+Load-generation benchmark for the QwenTTS bridge
+
+Drives /api/v1/synthesize, /api/v1/clone-voice and /api/v1/voices with
+configurable concurrency, text-length distribution, language and voice
+mix, and writes a JSON report (throughput, latency percentiles, error
+rates, bridge RSS over time) that can be diffed between releases.
+
+Usage:
+    # Against a running bridge
+    python benchmark.py --url http://localhost:8000 --concurrency 1,8,32 --duration 60
+
+    # Start a throwaway local bridge on the stand-in backend (no ComfyUI needed);
+    # STANDIN_* variables in the environment are passed through
+    python benchmark.py --standin --concurrency 1,8,32 --duration 30 --output report.json
+
+Mixes are comma-separated name=weight pairs, e.g.
+    --mix synthesize=0.85,voices=0.1,clone=0.05
+    --text-lengths short=0.6,medium=0.3,long=0.1
+    --languages en=0.7,zh=0.2,de=0.1
+    --voices custom=0.7,cloned=0.3
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger("qwentts-benchmark")
+
+# Text length buckets (characters)
+TEXT_LENGTHS = {
+    "short": (20, 80),
+    "medium": (80, 300),
+    "long": (300, 1200),
+}
+
+# Sentences the benchmark texts are assembled from, per language
+CORPUS = {
+    "en": [
+        "The weather in the valley turned cold overnight.",
+        "Please remember to bring your notebook to class tomorrow.",
+        "Grandmother told us the story of the old river bridge again.",
+        "Your order has been shipped and will arrive on Thursday.",
+        "Happy birthday, and may the coming year bring you joy!",
+        "Lesson four covers fractions, decimals and percentages.",
+        "The train to the city leaves every twenty minutes.",
+        "Thank you for calling; an agent will be with you shortly.",
+    ],
+    "zh": [
+        "今天的天气非常好，我们一起去公园散步吧。",
+        "请在明天上课之前完成你的作业。",
+        "奶奶又给我们讲了那座老桥的故事。",
+        "您的订单已经发货，预计星期四到达。",
+        "祝你生日快乐，新的一年万事如意！",
+    ],
+    "ja": [
+        "今日はとても良い天気ですね。",
+        "明日の授業までに宿題を終わらせてください。",
+        "ご注文の商品は木曜日に到着する予定です。",
+        "お誕生日おめでとうございます！",
+    ],
+    "de": [
+        "Das Wetter im Tal ist über Nacht kalt geworden.",
+        "Bitte denk daran, morgen dein Heft mitzubringen.",
+        "Ihre Bestellung wurde versandt und kommt am Donnerstag an.",
+        "Alles Gute zum Geburtstag!",
+    ],
+    "es": [
+        "El tiempo en el valle se volvió frío durante la noche.",
+        "Por favor, recuerda traer tu cuaderno mañana.",
+        "Tu pedido ha sido enviado y llegará el jueves.",
+        "¡Feliz cumpleaños!",
+    ],
+}
+
+CUSTOM_VOICES = [f"custom_{i}" for i in range(1, 10)]
+ENDPOINTS = ("synthesize", "clone", "voices")
+
+
+def parse_weights(spec: str, allowed) -> Dict[str, float]:
+    """Parse "a=0.5,b=0.5" into normalized weights"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in allowed:
+            raise ValueError(f"Unknown mix entry '{name}' (expected one of {sorted(allowed)})")
+        weights[name] = float(weight) if weight else 1.0
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Mix '{spec}' has no positive weight")
+    return {name: weight / total for name, weight in weights.items() if weight > 0}
+
+
+def pick(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def make_text(rng: random.Random, language: str, length_bucket: str) -> str:
+    """Assemble a text of the bucket's length from the language's sentences"""
+    low, high = TEXT_LENGTHS[length_bucket]
+    target = rng.randint(low, high)
+    sentences = CORPUS[language]
+    separator = "" if language in ("zh", "ja") else " "
+
+    text = ""
+    while len(text) < target:
+        text += (separator if text else "") + rng.choice(sentences)
+    return text[:high]
+
+
+def make_reference_wav(rng: random.Random, seconds: float = 3.0, sample_rate: int = 24000) -> bytes:
+    """Unique synthetic reference recording (so clone dedup doesn't short-circuit)"""
+    frequency = rng.uniform(100, 250)
+    frames = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        sample = 0.3 * ((i * frequency / sample_rate) % 1.0 - 0.5) + rng.uniform(-0.02, 0.02)
+        frames += struct.pack("<h", int(sample * 32767))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    started: float  # seconds since the level started
+    latency: float
+    status: int  # HTTP status, 0 for connection errors
+    audio_ms: int = 0
+    response_bytes: int = 0
+
+
+class Benchmark:
+    """Closed-loop load generator: each worker sends its next request when the last one finishes"""
+
+    def __init__(self, args: argparse.Namespace, pid: Optional[int] = None):
+        self.args = args
+        self.url = args.url.rstrip("/")
+        self.pid = pid
+        self.rng = random.Random(args.seed)
+
+        self.mix = parse_weights(args.mix, ENDPOINTS)
+        self.text_lengths = parse_weights(args.text_lengths, TEXT_LENGTHS)
+        self.languages = parse_weights(args.languages, CORPUS)
+        self.voices = parse_weights(args.voices, ("custom", "cloned"))
+
+        self.cloned_voices: List[str] = []
+        self.created_voices: List[str] = []
+
+    async def run(self) -> Dict[str, Any]:
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            bridge = await self._get_json(session, "/")
+
+            if "cloned" in self.voices:
+                await self._setup_cloned_voices(session)
+
+            levels = []
+            for concurrency in self.args.concurrency:
+                logger.info(f"Level: concurrency {concurrency} for {self.args.duration}s")
+                levels.append(await self._run_level(session, concurrency))
+                self._print_level(levels[-1])
+
+            if not self.args.keep_voices:
+                for voice_id in self.created_voices:
+                    async with session.delete(f"{self.url}/api/v1/voices/{voice_id}"):
+                        pass
+
+        return {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "url": self.url,
+                "bridge": bridge,
+                "args": {
+                    key: value for key, value in vars(self.args).items()
+                    if key not in ("output",)
+                },
+            },
+            "levels": levels,
+        }
+
+    async def _get_json(self, session: aiohttp.ClientSession, path: str) -> Any:
+        try:
+            async with session.get(f"{self.url}{path}") as response:
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"GET {path} failed: {e}")
+            return None
+
+    async def _setup_cloned_voices(self, session: aiohttp.ClientSession):
+        """Clone the voices the "cloned" share of the voice mix will use"""
+        for index in range(self.args.cloned_voices):
+            sample = await self._clone(session, 0.0, name=f"bench-voice-{index}")
+            if sample.status != 200:
+                raise RuntimeError(f"Could not create benchmark voice (HTTP {sample.status})")
+        self.cloned_voices = list(self.created_voices)
+        logger.info(f"Created {len(self.cloned_voices)} cloned voices")
+
+    async def _run_level(self, session: aiohttp.ClientSession, concurrency: int) -> Dict[str, Any]:
+        samples: List[Sample] = []
+        rss: List[List[float]] = []
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        remaining = [self.args.requests] if self.args.requests else None
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                if remaining is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                offset = time.perf_counter() - start
+                endpoint = pick(self.rng, self.mix)
+                if endpoint == "synthesize":
+                    samples.append(await self._synthesize(session, offset))
+                elif endpoint == "clone":
+                    samples.append(await self._clone(session, offset))
+                else:
+                    samples.append(await self._list_voices(session, offset))
+
+        async def sample_rss():
+            while True:
+                rss_mb = await self._rss_mb(session)
+                if rss_mb is not None:
+                    rss.append([round(time.perf_counter() - start, 2), round(rss_mb, 1)])
+                await asyncio.sleep(self.args.sample_interval)
+
+        sampler = asyncio.ensure_future(sample_rss())
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+
+        health = await self._get_json(session, "/health") or {}
+        return self._summarize(concurrency, elapsed, samples, rss, health)
+
+    async def _timed(self, endpoint: str, offset: float, request) -> Sample:
+        started = time.perf_counter()
+        try:
+            async with request() as response:
+                body = await response.read()
+                sample = Sample(endpoint, offset, 0.0, response.status, response_bytes=len(body))
+                if response.status == 200 and endpoint == "synthesize":
+                    if "X-Duration-Ms" in response.headers:
+                        sample.audio_ms = int(response.headers["X-Duration-Ms"])
+                    else:
+                        sample.audio_ms = json.loads(body).get("duration_ms", 0)
+                elif response.status == 200 and endpoint == "clone":
+                    self.created_voices.append(json.loads(body)["voice_id"])
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"{endpoint} failed: {e}")
+            sample = Sample(endpoint, offset, 0.0, 0)
+        sample.latency = time.perf_counter() - started
+        return sample
+
+    async def _synthesize(self, session: aiohttp.ClientSession, offset: float) -> Sample:
+        language = pick(self.rng, self.languages)
+        payload = {
+            "text": make_text(self.rng, language, pick(self.rng, self.text_lengths)),
+            "language": language,
+            "use_cache": self.args.use_cache,
+        }
+        if pick(self.rng, self.voices) == "cloned" and self.cloned_voices:
+            payload["voice"] = self.rng.choice(self.cloned_voices)
+        else:
+            payload["voice"] = self.rng.choice(CUSTOM_VOICES)
+
+        headers = {"Accept": "audio/wav"} if self.args.binary else {}
+        return await self._timed(
+            "synthesize",
+            offset,
+            lambda: session.post(f"{self.url}/api/v1/synthesize", json=payload, headers=headers),
+        )
+
+    async def _clone(self, session: aiohttp.ClientSession, offset: float, name: Optional[str] = None) -> Sample:
+        audio = make_reference_wav(self.rng)
+        name = name or f"bench-{self.rng.getrandbits(32):08x}"
+
+        def request():
+            form = aiohttp.FormData()
+            form.add_field("audio", audio, filename="reference.wav", content_type="audio/wav")
+            return session.post(
+                f"{self.url}/api/v1/clone-voice",
+                data=form,
+                params={"transcript": "Benchmark reference recording.", "name": name, "language": "en"},
+            )
+
+        return await self._timed("clone", offset, request)
+
+    async def _list_voices(self, session: aiohttp.ClientSession, offset: float) -> Sample:
+        params = {"limit": 50, "offset": self.rng.randint(0, 3) * 50}
+        return await self._timed(
+            "voices",
+            offset,
+            lambda: session.get(f"{self.url}/api/v1/voices", params=params),
+        )
+
+    async def _rss_mb(self, session: aiohttp.ClientSession) -> Optional[float]:
+        """Bridge RSS from its /metrics (process collector), else from /proc for a local pid"""
+        try:
+            async with session.get(f"{self.url}/metrics") as response:
+                match = re.search(
+                    r"^process_resident_memory_bytes\s+(\S+)$", await response.text(), re.MULTILINE
+                )
+                if match:
+                    return float(match.group(1)) / (1024 * 1024)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+        if self.pid:
+            try:
+                status = Path(f"/proc/{self.pid}/status").read_text()
+                return int(re.search(r"VmRSS:\s+(\d+)", status).group(1)) / 1024
+            except (OSError, AttributeError):
+                pass
+        return None
+
+    @staticmethod
+    def _summarize(
+        concurrency: int,
+        elapsed: float,
+        samples: List[Sample],
+        rss: List[List[float]],
+        health: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        by_endpoint: Dict[str, List[Sample]] = defaultdict(list)
+        for sample in samples:
+            by_endpoint[sample.endpoint].append(sample)
+
+        endpoints = {}
+        for endpoint, group in sorted(by_endpoint.items()):
+            ok = [sample.latency * 1000 for sample in group if sample.status == 200]
+            status_counts: Dict[str, int] = defaultdict(int)
+            for sample in group:
+                status_counts[str(sample.status)] += 1
+            errors = len(group) - len(ok)
+            endpoints[endpoint] = {
+                "requests": len(group),
+                "errors": errors,
+                "error_rate": round(errors / len(group), 4),
+                "status_counts": dict(status_counts),
+                "throughput_rps": round(len(group) / elapsed, 3),
+                "latency_ms": {
+                    "p50": _round(percentile(ok, 50)),
+                    "p95": _round(percentile(ok, 95)),
+                    "p99": _round(percentile(ok, 99)),
+                    "mean": _round(sum(ok) / len(ok) if ok else None),
+                    "max": _round(max(ok) if ok else None),
+                },
+            }
+
+        audio_seconds = sum(sample.audio_ms for sample in samples) / 1000
+        return {
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 2),
+            "requests": len(samples),
+            "errors": sum(1 for sample in samples if sample.status != 200),
+            "throughput_rps": round(len(samples) / elapsed, 3),
+            "audio_seconds_per_second": round(audio_seconds / elapsed, 3),
+            "endpoints": endpoints,
+            "rss_mb": {
+                "start": rss[0][1] if rss else None,
+                "peak": max(mb for _, mb in rss) if rss else None,
+                "end": rss[-1][1] if rss else None,
+                "samples": rss,
+            },
+            "bridge": {key: health.get(key) for key in ("cache", "single_flight", "pools")},
+        }
+
+    @staticmethod
+    def _print_level(level: Dict[str, Any]):
+        print(
+            f"\nconcurrency={level['concurrency']}  {level['requests']} requests in "
+            f"{level['duration_s']}s  ({level['throughput_rps']} req/s, "
+            f"{level['audio_seconds_per_second']} audio s/s, peak RSS {level['rss_mb']['peak']} MB)"
+        )
+        print(f"  {'endpoint':<12}{'reqs':>7}{'err%':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for endpoint, stats in level["endpoints"].items():
+            latency = stats["latency_ms"]
+            print(
+                f"  {endpoint:<12}{stats['requests']:>7}{stats['error_rate'] * 100:>7.1f}%"
+                f"{_fmt(latency['p50']):>10}{_fmt(latency['p95']):>10}{_fmt(latency['p99']):>10}"
+            )
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def start_standin_bridge(data_dir: Path) -> tuple[subprocess.Popen, str]:
+    """Run main.py on the stand-in backend with throwaway data directories"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    env = dict(os.environ)
+    env.setdefault("TTS_BACKEND", "standin")
+    env.update({
+        "PORT": str(port),
+        "VOICE_LIBRARY_PATH": str(data_dir / "voices"),
+        "MODEL_CACHE_PATH": str(data_dir / "models"),
+        "SYNTH_CACHE_PATH": str(data_dir / "cache"),
+        "JOBS_PATH": str(data_dir / "jobs"),
+    })
+    for name in ("voices", "models"):
+        (data_dir / name).mkdir(parents=True, exist_ok=True)
+
+    log = open(data_dir / "bridge.log", "wb")
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("main.py"))],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    """Wait for the bridge's /ready to return 200"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Bridge exited with code {process.returncode}")
+            try:
+                async with session.get(f"{url}/ready") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"Bridge at {url} not ready after {timeout}s")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-generation benchmark for the QwenTTS bridge")
+    parser.add_argument("--url", default="http://localhost:8000", help="Bridge base URL")
+    parser.add_argument("--standin", action="store_true",
+                        help="Start a local bridge on the stand-in backend instead of using --url")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        type=lambda value: [int(level) for level in value.split(",")],
+                        help="Comma-separated concurrency levels, run in order")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="Stop a level after this many requests (0 = run for --duration)")
+    parser.add_argument("--mix", default="synthesize=0.85,voices=0.1,clone=0.05",
+                        help="Endpoint mix")
+    parser.add_argument("--text-lengths", default="short=0.6,medium=0.3,long=0.1",
+                        help=f"Text length mix; buckets (chars): {TEXT_LENGTHS}")
+    parser.add_argument("--languages", default="en=1", help=f"Language mix of {sorted(CORPUS)}")
+    parser.add_argument("--voices", default="custom=0.7,cloned=0.3", help="Voice mix")
+    parser.add_argument("--cloned-voices", type=int, default=4,
+                        help="Cloned voices to create for the 'cloned' voice share")
+    parser.add_argument("--keep-voices", action="store_true", help="Don't delete voices the run created")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Allow result cache hits (default: measure synthesis itself)")
+    parser.add_argument("--binary", action="store_true", help="Request raw audio instead of JSON")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout (s)")
+    parser.add_argument("--ready-timeout", type=float, default=120, help="Wait for /ready up to (s)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="RSS sampling interval (s)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for texts, voices and mixes")
+    parser.add_argument("--output", default="benchmark-report.json", help="JSON report path")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    process = None
+    data_dir = None
+    if args.standin:
+        data_dir = Path(tempfile.mkdtemp(prefix="qwentts-bench-"))
+        process, args.url = start_standin_bridge(data_dir)
+        logger.info(f"Started stand-in bridge at {args.url} (logs: {data_dir / 'bridge.log'})")
+
+    try:
+        await wait_ready(args.url, args.ready_timeout, process)
+        report = await Benchmark(args, pid=process.pid if process else None).run()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    # Keep the stand-in's data (and bridge.log) only when the run failed
+    if data_dir is not None:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    logger.info(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -72,6 +72,7 @@ export interface VoiceInfo {
   description?: string;
   created_at: string;
   embedding_path?: string;
+  near_duplicate_of?: string;
 }
 
 // ============================================================================
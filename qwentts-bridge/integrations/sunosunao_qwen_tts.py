@@ -15,11 +15,13 @@ Author: ANKR Labs
 import asyncio
 import aiohttp
 import base64
+import json
 import logging
-from typing import Optional, AsyncGenerator, List, Dict, Any
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional, AsyncGenerator, AsyncIterable, List, Dict, Any
 from pathlib import Path
 from datetime import datetime
-from dataclasses import dataclass
 
 from .config import SunoSunaoConfig
 from .tts import BaseTTS
@@ -40,6 +42,7 @@ class VoiceInfo:
     description: Optional[str] = None
     created_at: str = ""
     embedding_path: Optional[str] = None
+    near_duplicate_of: Optional[str] = None
 
 
 @dataclass
@@ -50,10 +53,30 @@ class QwenSynthesizeRequest:
     voice: Optional[str] = None
     instruction: Optional[str] = None
     model: str = "Qwen3-TTS-12Hz-1.7B-CustomVoice"
-    max_tokens: int = 1024
+    max_tokens: Optional[int] = None  # None: bridge budgets from the text (calibrated per language)
     temperature: float = 0.7
     do_sample: bool = False
+    seed: Optional[int] = None
     streaming: bool = False
+    use_cache: bool = True
+    format: str = "wav"
+    sample_rate: Optional[int] = None
+    postprocess: Optional[Dict[str, Any]] = None  # e.g. {"trim_silence": True, "normalize": "rms"}
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Stage durations (ms) from a Server-Timing header: "queue;dur=12.1, generate;dur=850.2" """
+    timings = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if name and key == "dur":
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
 
 
 # ============================================================================
@@ -92,6 +115,7 @@ class QwenTTS(BaseTTS):
     ]
 
     MODELS = {
+        "auto": "auto",  # bridge picks large or small by its queue load
         "large": "Qwen3-TTS-12Hz-1.7B-CustomVoice",
         "small": "Qwen3-TTS-12Hz-0.6B-CustomVoice",
         "design": "Qwen3-TTS-12Hz-1.7B-VoiceDesign",
@@ -107,6 +131,7 @@ class QwenTTS(BaseTTS):
         timeout: int = 30,
         enable_voice_cloning: bool = True,
         enable_instructions: bool = True,
+        binary_audio: bool = True,
     ):
         """
         Initialize QwenTTS provider
@@ -114,10 +139,11 @@ class QwenTTS(BaseTTS):
         Args:
             bridge_url: URL of QwenTTS bridge service
             default_voice: Default voice (custom_1 to custom_9)
-            default_model: Default model (large, small, design)
+            default_model: Default model (auto, large, small, design)
             timeout: Request timeout in seconds
             enable_voice_cloning: Enable voice cloning features
             enable_instructions: Enable instruction-based control
+            binary_audio: Receive raw WAV bytes instead of base64 JSON
         """
         self.bridge_url = bridge_url.rstrip("/")
         self.default_voice = default_voice
@@ -125,6 +151,7 @@ class QwenTTS(BaseTTS):
         self.timeout = timeout
         self.enable_voice_cloning = enable_voice_cloning
         self.enable_instructions = enable_instructions
+        self.binary_audio = binary_audio
 
         self._session: Optional[aiohttp.ClientSession] = None
         self._voice_cache: Dict[str, VoiceInfo] = {}
@@ -172,10 +199,18 @@ class QwenTTS(BaseTTS):
             **kwargs: Additional parameters
                 - model: Model name or key
                 - temperature: Sampling temperature
-                - max_tokens: Max output tokens
+                - max_tokens: Max output tokens (default: calibrated by the bridge)
+                - seed: Random seed (makes sampled output cacheable)
+                - use_cache: Set False to bypass the bridge result cache
+                - format: Output format (wav, flac, ogg, mp3)
+                - sample_rate: Output sample rate in Hz
+                - postprocess: Bridge-side clean-up before encoding, e.g.
+                  {"trim_silence": True, "normalize": "peak", "fade_out_ms": 30}
+                - timings: Dict filled with the bridge's per-stage durations in ms
+                  (cache, embedding, queue, node, generate, encode, base64, total)
 
         Returns:
-            Audio bytes (WAV format)
+            Audio bytes (WAV unless another format is requested)
         """
         session = await self._get_session()
 
@@ -187,17 +222,30 @@ class QwenTTS(BaseTTS):
             "model": kwargs.get("model", self.default_model),
             "temperature": kwargs.get("temperature", 0.7),
             "do_sample": kwargs.get("do_sample", False),
-            "max_tokens": kwargs.get("max_tokens", self._estimate_tokens(text)),
+            "use_cache": kwargs.get("use_cache", True),
+            "format": kwargs.get("format", "wav"),
         }
 
+        if kwargs.get("max_tokens") is not None:
+            request["max_tokens"] = kwargs["max_tokens"]
+        if kwargs.get("seed") is not None:
+            request["seed"] = kwargs["seed"]
+        if kwargs.get("sample_rate") is not None:
+            request["sample_rate"] = kwargs["sample_rate"]
+        if kwargs.get("postprocess") is not None:
+            request["postprocess"] = kwargs["postprocess"]
+
         # Add instruction if enabled
         if self.enable_instructions and instruction:
             request["instruction"] = instruction
 
+        headers = {"Accept": "audio/*" if self.binary_audio else "application/json"}
+
         try:
             async with session.post(
                 f"{self.bridge_url}/api/v1/synthesize",
-                json=request
+                json=request,
+                headers=headers,
             ) as response:
                 if response.status != 200:
                     error_text = await response.text()
@@ -205,14 +253,24 @@ class QwenTTS(BaseTTS):
                         f"QwenTTS synthesis failed: {response.status} - {error_text}"
                     )
 
-                data = await response.json()
-                audio_b64 = data["audio"]
-                audio_bytes = base64.b64decode(audio_b64)
+                # Older bridges ignore Accept and always answer with JSON
+                if response.content_type == "application/json":
+                    data = await response.json()
+                    audio_bytes = base64.b64decode(data["audio"])
+                    model_used = data.get("model")
+                else:
+                    audio_bytes = await response.read()
+                    model_used = response.headers.get("X-Model")
+
+                timings = parse_server_timing(response.headers.get("Server-Timing"))
+                if kwargs.get("timings") is not None:
+                    kwargs["timings"].update(timings)
 
                 logger.info(
                     f"Synthesized: '{text[:50]}...' "
-                    f"({lang}, {request['voice']}) → {len(audio_bytes)} bytes"
+                    f"({lang}, {request['voice']}, {model_used}) → {len(audio_bytes)} bytes"
                 )
+                logger.debug(f"Bridge stage timings (ms): {timings}")
 
                 return audio_bytes
 
@@ -225,20 +283,280 @@ class QwenTTS(BaseTTS):
         text: str,
         lang: str = "en",
         voice: Optional[str] = None,
+        instruction: Optional[str] = None,
         **kwargs
     ) -> AsyncGenerator[bytes, None]:
         """
-        Stream synthesized speech (currently yields full audio)
+        Stream synthesized speech as it is generated
 
-        Note: Streaming is not yet implemented in bridge service,
-        so this yields the full audio in chunks
+        The bridge synthesizes sentence by sentence and sends a WAV stream
+        (open-ended header followed by 16-bit PCM), so the first chunk
+        arrives after the first sentence rather than the whole text.
+
+        Args:
+            text: Text to synthesize
+            lang: Language code
+            voice: Voice ID (custom_1-9 or cloned voice_id)
+            instruction: Style instruction
+            **kwargs: Same as synthesize(), plus chunk_size (bytes per yield)
         """
-        audio = await self.synthesize(text, lang, voice, **kwargs)
+        session = await self._get_session()
+
+        request = {
+            "text": text,
+            "language": lang,
+            "voice": voice or self.default_voice,
+            "model": kwargs.get("model", self.default_model),
+            "temperature": kwargs.get("temperature", 0.7),
+            "do_sample": kwargs.get("do_sample", False),
+            "streaming": True,
+        }
+
+        if kwargs.get("max_tokens") is not None:
+            request["max_tokens"] = kwargs["max_tokens"]
+
+        if self.enable_instructions and instruction:
+            request["instruction"] = instruction
 
-        # Yield in chunks
         chunk_size = kwargs.get("chunk_size", 4096)
-        for i in range(0, len(audio), chunk_size):
-            yield audio[i:i + chunk_size]
+
+        try:
+            async with session.post(
+                f"{self.bridge_url}/api/v1/synthesize",
+                json=request
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(
+                        f"QwenTTS streaming failed: {response.status} - {error_text}"
+                    )
+
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+
+        except Exception as e:
+            logger.error(f"QwenTTS streaming error: {e}")
+            raise
+
+    async def synthesize_incremental(
+        self,
+        text_stream: AsyncIterable[str],
+        lang: str = "en",
+        voice: Optional[str] = None,
+        instruction: Optional[str] = None,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Synthesize text while it is still being produced (e.g. LLM tokens)
+
+        Fragments are sent over the bridge WebSocket as they arrive; the
+        bridge synthesizes each sentence once it is complete, so the first
+        audio follows the first sentence instead of the whole reply.
+
+        Args:
+            text_stream: Async iterable of text fragments
+            lang: Language code
+            voice: Voice ID (custom_1-9 or cloned voice_id)
+            instruction: Style instruction
+            **kwargs: model, max_tokens, temperature, do_sample, seed
+
+        Yields:
+            One record per sentence, in order: "index", "text" and "status";
+            successful records carry "audio" (16-bit mono PCM bytes),
+            sample_rate, duration_ms and model, failed ones "error" and
+            "status_code"
+        """
+        session = await self._get_session()
+
+        start = {
+            "type": "start",
+            "language": lang,
+            "voice": voice or self.default_voice,
+            "model": kwargs.get("model", self.default_model),
+            "temperature": kwargs.get("temperature", 0.7),
+            "do_sample": kwargs.get("do_sample", False),
+        }
+        for key in ("max_tokens", "seed"):
+            if kwargs.get(key) is not None:
+                start[key] = kwargs[key]
+        if self.enable_instructions and instruction:
+            start["instruction"] = instruction
+
+        ws_url = self.bridge_url.replace("http", "ws", 1) + "/api/v1/synthesize/ws"
+
+        send_errors: List[BaseException] = []
+
+        async def send_text(ws: aiohttp.ClientWebSocketResponse):
+            try:
+                await ws.send_json(start)
+                async for fragment in text_stream:
+                    if fragment:
+                        await ws.send_json({"type": "text", "text": fragment})
+                await ws.send_json({"type": "end"})
+            except Exception as e:
+                # No "end" will follow: close the socket so the receive loop stops too
+                send_errors.append(e)
+                await ws.close()
+
+        try:
+            async with session.ws_connect(ws_url) as ws:
+                sender = asyncio.create_task(send_text(ws))
+                try:
+                    pending = None
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.BINARY and pending:
+                            yield {**pending, "status": "ok", "audio": message.data}
+                            pending = None
+                            continue
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+
+                        record = json.loads(message.data)
+                        kind = record.pop("type", None)
+                        if kind == "audio":
+                            pending = record
+                        elif kind == "error":
+                            if "index" not in record:
+                                raise Exception(f"QwenTTS incremental synthesis failed: {record.get('error')}")
+                            yield {**record, "status": "error"}
+                        elif kind == "done":
+                            break
+
+                    if send_errors:
+                        raise send_errors[0]
+                finally:
+                    sender.cancel()
+
+        except Exception as e:
+            logger.error(f"QwenTTS incremental synthesis error: {e}")
+            raise
+
+    async def synthesize_batch(
+        self,
+        requests: List[QwenSynthesizeRequest],
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Synthesize many texts in one bridge call
+
+        Results arrive as each item finishes (not in input order). Each
+        record has "index" (position in requests) and "status"; successful
+        records carry "audio" as bytes plus format, sample_rate and
+        duration_ms, failed ones carry "error" and "status_code". One failed
+        item does not stop the batch.
+
+        Args:
+            requests: Items to synthesize
+
+        Yields:
+            One result record per item
+        """
+        session = await self._get_session()
+
+        items = []
+        for request in requests:
+            item = {k: v for k, v in asdict(request).items() if v is not None}
+            if not self.enable_instructions:
+                item.pop("instruction", None)
+            item["streaming"] = False
+            items.append(item)
+
+        # The batch as a whole can run far longer than a single request
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.timeout)
+
+        try:
+            async with session.post(
+                f"{self.bridge_url}/api/v1/synthesize/batch",
+                json={"items": items},
+                timeout=timeout,
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(
+                        f"QwenTTS batch synthesis failed: {response.status} - {error_text}"
+                    )
+
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("status") == "ok":
+                        record["audio"] = base64.b64decode(record["audio"])
+                    yield record
+
+        except Exception as e:
+            logger.error(f"QwenTTS batch synthesis error: {e}")
+            raise
+
+    async def submit_synthesis_job(self, request: QwenSynthesizeRequest) -> str:
+        """
+        Queue a synthesis as a background job on the bridge
+
+        Use for texts too long to wait on in one HTTP request; follow up
+        with wait_for_job() and get_job_audio().
+
+        Returns:
+            Job ID
+        """
+        session = await self._get_session()
+
+        payload = {k: v for k, v in asdict(request).items() if v is not None}
+        if not self.enable_instructions:
+            payload.pop("instruction", None)
+
+        async with session.post(
+            f"{self.bridge_url}/api/v1/jobs/synthesize",
+            json=payload,
+        ) as response:
+            if response.status != 202:
+                error_text = await response.text()
+                raise Exception(f"QwenTTS job submit failed: {response.status} - {error_text}")
+            return (await response.json())["job_id"]
+
+    async def get_job(self, job_id: str, wait: float = 0) -> Dict[str, Any]:
+        """
+        Get a bridge job's status
+
+        Args:
+            job_id: Job ID
+            wait: Long-poll up to this many seconds (max 60) for completion
+        """
+        session = await self._get_session()
+
+        async with session.get(
+            f"{self.bridge_url}/api/v1/jobs/{job_id}",
+            params={"wait": wait},
+            timeout=aiohttp.ClientTimeout(total=wait + self.timeout),
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Get job failed: {response.status}")
+            return await response.json()
+
+    async def wait_for_job(self, job_id: str, timeout: float = 600) -> Dict[str, Any]:
+        """
+        Wait for a job to finish
+
+        Returns:
+            The finished job; raises if it failed or timeout passes first
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            job = await self.get_job(job_id, wait=max(0, min(60, remaining)))
+            if job["status"] == "succeeded":
+                return job
+            if job["status"] == "failed":
+                raise Exception(f"QwenTTS job {job_id} failed: {job.get('error')}")
+            if remaining <= 0:
+                raise TimeoutError(f"QwenTTS job {job_id} still {job['status']}")
+
+    async def get_job_audio(self, job_id: str) -> bytes:
+        """Download the audio of a finished synthesis job"""
+        session = await self._get_session()
+
+        async with session.get(f"{self.bridge_url}/api/v1/jobs/{job_id}/audio") as response:
+            if response.status != 200:
+                raise Exception(f"Get job audio failed: {response.status}")
+            return await response.read()
 
     async def clone_voice(
         self,
@@ -363,12 +681,37 @@ class QwenTTS(BaseTTS):
             logger.error(f"Voice design error: {e}")
             raise
 
-    async def list_voices(self) -> List[VoiceInfo]:
-        """List all voices in library"""
+    async def list_voices(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        language: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[VoiceInfo]:
+        """
+        List voices in library
+
+        Args:
+            limit: Max voices to return (all when None)
+            offset: Number of voices to skip
+            language: Only voices in this language
+            name_prefix: Only voices whose name starts with this (case-insensitive)
+        """
         session = await self._get_session()
 
+        params: Dict[str, Any] = {"offset": offset}
+        if limit is not None:
+            params["limit"] = limit
+        if language:
+            params["language"] = language
+        if name_prefix:
+            params["name_prefix"] = name_prefix
+
         try:
-            async with session.get(f"{self.bridge_url}/api/v1/voices") as response:
+            async with session.get(
+                f"{self.bridge_url}/api/v1/voices",
+                params=params
+            ) as response:
                 if response.status != 200:
                     raise Exception(f"List voices failed: {response.status}")
 
@@ -410,10 +753,14 @@ class QwenTTS(BaseTTS):
         if self._session and not self._session.closed:
             await self._session.close()
 
-    def _estimate_tokens(self, text: str) -> int:
-        """Estimate max tokens needed"""
-        estimated = int(len(text) * 1.5)
-        return max(128, min(4096, estimated))
+    async def get_token_calibration(self) -> Dict[str, Any]:
+        """Bridge's learned tokens-per-character table (used to budget max_tokens)"""
+        session = await self._get_session()
+
+        async with session.get(f"{self.bridge_url}/api/v1/calibration/max-tokens") as response:
+            if response.status != 200:
+                raise Exception(f"Get token calibration failed: {response.status}")
+            return await response.json()
 
 
 # ============================================================================
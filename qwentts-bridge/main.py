@@ -14,35 +14,70 @@ Author: ANKR Labs
 
 import asyncio
 import base64
+import functools
+import gc
 import hashlib
+import heapq
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import random
+import re
+import sqlite3
+import struct
+import threading
 import time
-from datetime import datetime
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
 import aiofiles
 import numpy as np
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import (
+    FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Header, Query,
+    WebSocket, WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, Response
-from pydantic import BaseModel, Field
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, Field, ValidationError
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
 import soundfile as sf
 
-# ComfyUI imports (will be available when running in ComfyUI environment)
+# Engine backend: "comfyui" (Qwen3-TTS nodes, available when running in the ComfyUI
+# environment) or "standin" (deterministic synthetic audio for load tests, no model needed)
+TTS_BACKEND = os.getenv("TTS_BACKEND", "comfyui").lower()
+
 try:
-    from nodes import NODE_CLASS_MAPPINGS
+    if TTS_BACKEND == "standin":
+        from standin_backend import NODE_CLASS_MAPPINGS
+    else:
+        from nodes import NODE_CLASS_MAPPINGS
     QWEN_NODES = {
         'CustomVoice': NODE_CLASS_MAPPINGS.get('AILab_QwenTTS'),
         'VoiceDesign': NODE_CLASS_MAPPINGS.get('AILab_QwenTTS_VoiceDesign'),
         'VoiceClone': NODE_CLASS_MAPPINGS.get('AILab_QwenTTS_VoiceClone'),
     }
-    COMFYUI_AVAILABLE = True
+    BACKEND_AVAILABLE = True
 except ImportError:
-    COMFYUI_AVAILABLE = False
+    BACKEND_AVAILABLE = False
     QWEN_NODES = {}
+COMFYUI_AVAILABLE = BACKEND_AVAILABLE and TTS_BACKEND != "standin"
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("qwentts-bridge")
@@ -57,11 +92,280 @@ VOICE_LIBRARY_PATH.mkdir(parents=True, exist_ok=True)
 MODEL_CACHE_PATH = Path(os.getenv("MODEL_CACHE_PATH", "/data/models"))
 MODEL_CACHE_PATH.mkdir(parents=True, exist_ok=True)
 
+# Indexed voice catalog (kept in sync by save_voice / delete_voice)
+VOICE_CATALOG_PATH = Path(os.getenv("VOICE_CATALOG_PATH", str(VOICE_LIBRARY_PATH / "catalog.db")))
+
+# Memory-mapped matrix of all voice embeddings (rows indexed by a sidecar <name>.index log)
+VOICE_MATRIX_PATH = Path(os.getenv("VOICE_MATRIX_PATH", str(VOICE_LIBRARY_PATH / "embeddings.f32")))
+# Clones at least this cosine-similar to an existing voice report it as near_duplicate_of (0 disables)
+VOICE_DUPLICATE_SIMILARITY = float(os.getenv("VOICE_DUPLICATE_SIMILARITY", "0"))
+# Voice embedding storage: full (as returned by the node), float16, or int8 (per-vector scaled)
+VOICE_EMBEDDING_PRECISION = os.getenv("VOICE_EMBEDDING_PRECISION", "full")
+
+# In-process voice embedding cache (LRU, bounded by entry count and bytes)
+VOICE_CACHE_MAX_ENTRIES = int(os.getenv("VOICE_CACHE_MAX_ENTRIES", "256"))
+VOICE_CACHE_MAX_BYTES = int(os.getenv("VOICE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Warm model residency: total memory budget for resident node/model instances
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "12000"))
+# Concurrent calls allowed into one warm node instance (1 serializes all calls); only
+# applies to backends whose nodes declare THREAD_SAFE - ComfyUI nodes are always serialized
+NODE_CONCURRENCY = int(os.getenv("NODE_CONCURRENCY", "1"))
+
+# Worker pools: threads and max queued requests per workload
+SYNTH_POOL_WORKERS = int(os.getenv("SYNTH_POOL_WORKERS", "2"))
+SYNTH_POOL_MAX_QUEUE = int(os.getenv("SYNTH_POOL_MAX_QUEUE", "64"))
+CLONE_POOL_WORKERS = int(os.getenv("CLONE_POOL_WORKERS", "1"))
+CLONE_POOL_MAX_QUEUE = int(os.getenv("CLONE_POOL_MAX_QUEUE", "8"))
+DESIGN_POOL_WORKERS = int(os.getenv("DESIGN_POOL_WORKERS", "1"))
+DESIGN_POOL_MAX_QUEUE = int(os.getenv("DESIGN_POOL_MAX_QUEUE", "8"))
+
+# Texts up to this length go in the interactive lane unless the request says otherwise
+INTERACTIVE_MAX_CHARS = int(os.getenv("INTERACTIVE_MAX_CHARS", "300"))
+
+# Synthesis result cache (deterministic requests only)
+SYNTH_CACHE_ENABLED = os.getenv("SYNTH_CACHE_ENABLED", "true").lower() == "true"
+SYNTH_CACHE_MEMORY_BYTES = int(os.getenv("SYNTH_CACHE_MEMORY_BYTES", str(256 * 1024 * 1024)))
+SYNTH_CACHE_DISK_BYTES = int(os.getenv("SYNTH_CACHE_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))
+SYNTH_CACHE_PATH = Path(os.getenv("SYNTH_CACHE_PATH", "/data/cache/synthesis"))
+SYNTH_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+
+# Streaming: text is synthesized in sentence/clause segments of at most this many characters
+STREAM_SEGMENT_MAX_CHARS = int(os.getenv("STREAM_SEGMENT_MAX_CHARS", "200"))
+# WebSocket synthesis: sentences synthesized ahead of the one being sent, per connection
+WS_SEGMENTS_AHEAD = int(os.getenv("WS_SEGMENTS_AHEAD", "3"))
+
+# Voice cloning: reference audio is decoded, downmixed and resampled to this rate first
+CLONE_REFERENCE_SAMPLE_RATE = int(os.getenv("CLONE_REFERENCE_SAMPLE_RATE", "24000"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Adaptive max_tokens (used when a request doesn't set max_tokens): budget =
+# chars x learned tokens-per-char (mean + TOKEN_BUDGET_STD_MARGIN std devs) x (1 + TOKEN_BUDGET_MARGIN)
+TOKEN_BUDGET_MARGIN = float(os.getenv("TOKEN_BUDGET_MARGIN", "0.15"))
+TOKEN_BUDGET_STD_MARGIN = float(os.getenv("TOKEN_BUDGET_STD_MARGIN", "2.5"))
+TOKEN_BUDGET_MIN = int(os.getenv("TOKEN_BUDGET_MIN", "64"))
+TOKEN_BUDGET_MAX = int(os.getenv("TOKEN_BUDGET_MAX", "4096"))
+TOKEN_CALIBRATION_PATH = Path(
+    os.getenv("TOKEN_CALIBRATION_PATH", str(MODEL_CACHE_PATH / "token_calibration.json"))
+)
+
+# Model "auto": the 1.7B model while the synthesis queue's expected wait is under the SLO,
+# the 0.6B sibling above it (back to 1.7B once the wait drops below RECOVER_RATIO x SLO)
+AUTO_MODEL_SLO_MS = float(os.getenv("AUTO_MODEL_SLO_MS", "1500"))
+AUTO_MODEL_RECOVER_RATIO = float(os.getenv("AUTO_MODEL_RECOVER_RATIO", "0.5"))
+
+# Warmup: models loaded and exercised once at startup before /ready reports ready
+# (comma-separated QwenModel names; empty = ready immediately)
+WARMUP_MODELS = [
+    name.strip() for name in
+    os.getenv("WARMUP_MODELS", "Qwen3-TTS-12Hz-1.7B-CustomVoice").split(",")
+    if name.strip()
+]
+WARMUP_TEXT = os.getenv("WARMUP_TEXT", "Warming up.")
+WARMUP_MAX_TOKENS = int(os.getenv("WARMUP_MAX_TOKENS", "64"))
+
+# Async jobs: persisted under JOBS_PATH, finished jobs expire after JOB_TTL_SECONDS
+JOBS_PATH = Path(os.getenv("JOBS_PATH", "/data/jobs"))
+JOBS_PATH.mkdir(parents=True, exist_ok=True)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "1000"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+
+# Batch endpoint: items in flight at once per batch call
+BATCH_ENDPOINT_CONCURRENCY = int(os.getenv("BATCH_ENDPOINT_CONCURRENCY", "32"))
+
+# Output encoding runs in a process pool (0 = encode in a thread instead)
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "2"))
+
+# Long-text mode: texts above the threshold are segmented, synthesized concurrently and stitched
+LONG_TEXT_THRESHOLD_CHARS = int(os.getenv("LONG_TEXT_THRESHOLD_CHARS", "600"))
+LONG_TEXT_CROSSFADE_MS = float(os.getenv("LONG_TEXT_CROSSFADE_MS", "20"))
+LONG_TEXT_PAUSE_MS = float(os.getenv("LONG_TEXT_PAUSE_MS", "180"))
+
+# Stage timing trace logs: one JSON line per sampled synthesis request
+TIMING_TRACE = os.getenv("TIMING_TRACE", "false").lower() == "true"
+TIMING_TRACE_SAMPLE_RATE = float(os.getenv("TIMING_TRACE_SAMPLE_RATE", "0.01"))
+
+# Languages supported by Qwen3-TTS (anything else is labeled "other" in metrics)
+SUPPORTED_LANGUAGES = {"en", "zh", "ja", "ko", "de", "fr", "ru", "pt", "es", "it"}
+
+# ============================================================================
+# Metrics
+# ============================================================================
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60, 120)
+
+REQUESTS_TOTAL = Counter(
+    "qwentts_requests_total",
+    "Requests handled, by endpoint and outcome",
+    ["endpoint", "model", "language", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "qwentts_request_duration_seconds",
+    "End-to-end request latency",
+    ["endpoint", "model", "language"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT = Histogram(
+    "qwentts_queue_wait_seconds",
+    "Time spent waiting for a worker in a pool",
+    ["pool", "priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+REALTIME_FACTOR = Histogram(
+    "qwentts_realtime_factor",
+    "Audio seconds produced per compute second (higher is faster)",
+    ["model", "language"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20),
+)
+OUTPUT_BYTES = Counter(
+    "qwentts_output_bytes_total",
+    "Audio bytes returned to clients",
+    ["endpoint", "model", "language"],
+)
+CACHE_LOOKUPS = Counter(
+    "qwentts_cache_lookups_total",
+    "Synthesis cache lookups by result (hit_memory, hit_disk, miss, bypass)",
+    ["result"],
+)
+VOICE_CACHE_LOOKUPS = Counter(
+    "qwentts_voice_cache_lookups_total",
+    "Voice embedding cache lookups by result (hit, miss)",
+    ["result"],
+)
+MODEL_LOAD_DURATION = Histogram(
+    "qwentts_model_loading_duration_seconds",
+    "Time to create a node and load its model",
+    ["node", "model"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 20, 40, 80, 160),
+)
+MODEL_EVICTIONS = Counter(
+    "qwentts_model_evictions_total",
+    "Resident models evicted to stay within the memory budget",
+    ["node", "model"],
+)
+CLONE_DEDUP_HITS = Counter(
+    "qwentts_clone_dedup_hits_total",
+    "Clone requests answered with a voice already cloned from the same audio and transcript",
+)
+CLONE_NEAR_DUPLICATES = Counter(
+    "qwentts_clone_near_duplicates_total",
+    "Clones whose embedding nearly matched an existing voice (reported as near_duplicate_of)",
+)
+TOKEN_BUDGET = Histogram(
+    "qwentts_max_tokens_budget",
+    "max_new_tokens given to the model per generation",
+    ["model", "source"],
+    buckets=(64, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048, 4096),
+)
+GENERATIONS_TRUNCATED = Counter(
+    "qwentts_truncated_generations_total",
+    "Generations that used their whole max_new_tokens budget (audio likely cut off)",
+    ["model", "language"],
+)
+AUTO_MODEL_ROUTES = Counter(
+    "qwentts_auto_model_routes_total",
+    "Requests for model \"auto\" by the model they were routed to",
+    ["model"],
+)
+AUTO_MODEL_DEGRADED = Gauge(
+    "qwentts_auto_model_degraded",
+    "1 while \"auto\" requests are routed to the smaller model",
+)
+COALESCED_REQUESTS = Counter(
+    "qwentts_coalesced_requests_total",
+    "Synthesis requests served by an identical in-flight generation",
+    ["model"],
+)
+POOL_WORKERS = Gauge("qwentts_pool_workers", "Worker threads per pool", ["pool"])
+POOL_ACTIVE = Gauge("qwentts_pool_active_workers", "Busy workers per pool", ["pool"])
+POOL_QUEUE_DEPTH = Gauge("qwentts_pool_queue_depth", "Requests waiting per pool", ["pool"])
+POOL_REJECTED = Counter(
+    "qwentts_pool_rejected_total",
+    "Requests rejected because the pool queue was full",
+    ["pool"],
+)
+ACTIVE_VOICES = Gauge("qwentts_active_voices", "Voices in library")
+
+
+def language_label(language: str) -> str:
+    """Bound metric label cardinality to the supported languages"""
+    return language if language in SUPPORTED_LANGUAGES else "other"
+
+
+def record_request(endpoint: str, model: str, language: str, status: str, seconds: float):
+    language = language_label(language)
+    REQUESTS_TOTAL.labels(endpoint, model, language, status).inc()
+    REQUEST_DURATION.labels(endpoint, model, language).observe(seconds)
+
+
+# ============================================================================
+# Stage Timing
+# ============================================================================
+
+class StageTimings:
+    """
+    Wall time per processing stage of one request, in milliseconds
+
+    Stages that run more than once (e.g. long-text segments synthesized in
+    parallel) accumulate, so the stages can add up to more than "total".
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def merge(self, stages: Dict[str, float]):
+        for stage, ms in stages.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def server_timing(self) -> str:
+        """Server-Timing header value"""
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items())
+
+
+# Timings of the request being handled; tasks it starts inherit them
+current_timings: ContextVar[Optional[StageTimings]] = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Add the block's wall time to the current request's timings (no-op outside one)"""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+
+def trace_timings(endpoint: str, request: "SynthesizeRequest", status: str, timings: StageTimings):
+    """Log a structured trace line for a sample of requests (TIMING_TRACE)"""
+    if not TIMING_TRACE or random.random() >= TIMING_TRACE_SAMPLE_RATE:
+        return
+    logger.info(json.dumps({
+        "event": "stage_timings",
+        "endpoint": endpoint,
+        "status": status,
+        "model": request.model.value,
+        "language": request.language,
+        "voice": request.voice,
+        "chars": len(request.text),
+        "stages_ms": {stage: round(ms, 1) for stage, ms in timings.stages.items()},
+    }, ensure_ascii=False))
+
+
 # ============================================================================
 # Models
 # ============================================================================
 
 class QwenModel(str, Enum):
+    AUTO = "auto"  # 1.7B or 0.6B CustomVoice depending on load (see ModelRouter)
     CUSTOM_VOICE_1_7B = "Qwen3-TTS-12Hz-1.7B-CustomVoice"
     CUSTOM_VOICE_0_6B = "Qwen3-TTS-12Hz-0.6B-CustomVoice"
     VOICE_DESIGN_1_7B = "Qwen3-TTS-12Hz-1.7B-VoiceDesign"
@@ -69,6 +373,49 @@ class QwenModel(str, Enum):
     BASE_0_6B = "Qwen3-TTS-12Hz-0.6B-Base"
 
 
+class AudioFormat(str, Enum):
+    WAV = "wav"
+    FLAC = "flac"
+    OGG = "ogg"  # Opus (Vorbis if this libsndfile has no Opus)
+    MP3 = "mp3"
+
+
+class EmbeddingPrecision(str, Enum):
+    """Storage precision of voice embeddings"""
+    FULL = "full"        # as returned by the node
+    FLOAT16 = "float16"
+    INT8 = "int8"        # one float32 scale per vector (last axis)
+
+
+class NormalizeMode(str, Enum):
+    PEAK = "peak"
+    RMS = "rms"
+
+
+class PostProcessOptions(BaseModel):
+    """Audio clean-up applied after synthesis, before encoding"""
+    trim_silence: bool = Field(False, description="Trim leading and trailing silence")
+    silence_threshold_db: float = Field(
+        -45.0, ge=-96.0, le=0.0, description="Level (dBFS) below which edge samples count as silence"
+    )
+    normalize: Optional[NormalizeMode] = Field(None, description="Loudness normalization: peak or rms")
+    target_db: Optional[float] = Field(
+        None, ge=-60.0, le=0.0, description="Normalization target in dBFS (default: -1 peak, -20 rms)"
+    )
+    fade_in_ms: float = Field(0.0, ge=0.0, le=5000.0, description="Linear fade-in length")
+    fade_out_ms: float = Field(0.0, ge=0.0, le=5000.0, description="Linear fade-out length")
+
+
+class Priority(str, Enum):
+    """Scheduling lane; interactive work is dequeued before bulk work"""
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+    @property
+    def rank(self) -> int:
+        return 0 if self is Priority.INTERACTIVE else 1
+
+
 class CustomVoice(str, Enum):
     """9 premium custom voices"""
     VOICE_1 = "custom_1"
@@ -87,11 +434,30 @@ class SynthesizeRequest(BaseModel):
     language: str = Field("en", description="Language code (en, zh, ja, ko, de, fr, ru, pt, es, it)")
     voice: Optional[str] = Field(None, description="Voice ID from library or custom_1-9")
     instruction: Optional[str] = Field(None, description="Style instruction (e.g., 'speak warmly', 'urgent tone')")
-    model: QwenModel = Field(QwenModel.CUSTOM_VOICE_1_7B, description="Model to use")
-    max_tokens: int = Field(1024, ge=128, le=4096, description="Max output tokens")
+    model: QwenModel = Field(
+        QwenModel.CUSTOM_VOICE_1_7B,
+        description="Model to use (\"auto\": picked by load; the response reports the actual model)",
+    )
+    max_tokens: Optional[int] = Field(
+        None, ge=128, le=4096,
+        description="Max output tokens (default: calibrated per language and model from the text length)",
+    )
     temperature: float = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
     do_sample: bool = Field(False, description="Enable sampling (False for stability)")
+    seed: Optional[int] = Field(None, description="Random seed (makes sampled output cacheable)")
     streaming: bool = Field(False, description="Stream audio chunks")
+    use_cache: bool = Field(True, description="Serve/store identical requests from the result cache")
+    priority: Optional[Priority] = Field(None, description="Scheduling lane (default: interactive for short texts, bulk otherwise)")
+    long_text: Optional[bool] = Field(None, description="Segment by sentence and stitch (default: automatic for long texts); no faster on the ComfyUI backend, where segments run one after another")
+    format: AudioFormat = Field(AudioFormat.WAV, description="Output format (wav, flac, ogg, mp3)")
+    sample_rate: Optional[int] = Field(None, ge=8000, le=48000, description="Output sample rate in Hz (default: model rate)")
+    postprocess: Optional[PostProcessOptions] = Field(
+        None, description="Trim silence, normalize loudness and fade before encoding (not applied to streams)"
+    )
+
+
+class BatchSynthesizeRequest(BaseModel):
+    items: List[SynthesizeRequest] = Field(..., min_length=1, max_length=10000, description="Requests to synthesize")
 
 
 class CloneVoiceRequest(BaseModel):
@@ -108,6 +474,25 @@ class DesignVoiceRequest(BaseModel):
     save_to_library: bool = Field(True, description="Save to voice library")
 
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    status: JobStatus = JobStatus.QUEUED
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    expires_at: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
 class VoiceInfo(BaseModel):
     voice_id: str
     name: str
@@ -115,11 +500,33 @@ class VoiceInfo(BaseModel):
     description: Optional[str] = None
     created_at: str
     embedding_path: Optional[str] = None
+    near_duplicate_of: Optional[str] = Field(
+        None, description="Existing voice a new clone nearly matches (VOICE_DUPLICATE_SIMILARITY), if any"
+    )
+
+
+class PrecisionValidationRequest(BaseModel):
+    voice_ids: Optional[List[str]] = Field(
+        None, description="Voices to check (default: the first `limit` voices stored at full precision)"
+    )
+    limit: int = Field(5, ge=1, le=100, description="Voices to check when voice_ids is not given")
+    precisions: List[EmbeddingPrecision] = Field(
+        [EmbeddingPrecision.FLOAT16, EmbeddingPrecision.INT8], description="Storage precisions to compare"
+    )
+    text: str = Field("The quick brown fox jumps over the lazy dog.", description="Text to synthesize")
+    language: str = Field("en", description="Language code")
+    model: QwenModel = Field(QwenModel.CUSTOM_VOICE_1_7B, description="Model to synthesize with")
+
+
+class SimilarVoice(BaseModel):
+    voice: VoiceInfo
+    similarity: float
+    near_duplicate: bool
 
 
 class SynthesizeResponse(BaseModel):
     audio: str = Field(..., description="Base64-encoded audio")
-    format: str = Field("wav", description="Audio format")
+    format: str = Field("wav", description="Audio format (wav, flac, ogg, mp3)")
     sample_rate: int = Field(24000, description="Sample rate in Hz")
     duration_ms: int = Field(..., description="Duration in milliseconds")
     voice_id: Optional[str] = None
@@ -149,24 +556,625 @@ app.add_middleware(
 # Voice Library Management
 # ============================================================================
 
+@dataclass
+class StoredEmbedding:
+    """
+    A voice embedding in its storage precision
+
+    The precision follows from the values' dtype: int8 values carry one
+    scale per vector (along the last axis), float16 values are quantized
+    float32, anything else is full precision. dequantize() returns float32
+    for quantized storage and full-precision values unchanged.
+    """
+    values: np.ndarray
+    scale: Optional[np.ndarray] = None
+
+    @property
+    def precision(self) -> EmbeddingPrecision:
+        if self.values.dtype == np.int8:
+            return EmbeddingPrecision.INT8
+        if self.values.dtype == np.float16:
+            return EmbeddingPrecision.FLOAT16
+        return EmbeddingPrecision.FULL
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def dequantize(self) -> np.ndarray:
+        if self.precision == EmbeddingPrecision.INT8:
+            return self.values.astype(np.float32) * self.scale
+        if self.precision == EmbeddingPrecision.FLOAT16:
+            return self.values.astype(np.float32)
+        return self.values
+
+    @classmethod
+    def quantize(cls, embedding: np.ndarray, precision: EmbeddingPrecision) -> "StoredEmbedding":
+        embedding = np.asarray(embedding)
+        if precision == EmbeddingPrecision.FLOAT16:
+            return cls(embedding.astype(np.float16))
+        if precision == EmbeddingPrecision.INT8:
+            vectors = embedding.astype(np.float32)
+            peak = np.abs(vectors).max(axis=-1, keepdims=True)
+            scale = np.where(peak > 0, peak / 127, 1.0).astype(np.float32)
+            return cls(np.rint(vectors / scale).astype(np.int8), scale)
+        return cls(embedding)
+
+    @classmethod
+    def read(cls, voice_dir: Path) -> "StoredEmbedding":
+        # Map the file and copy out, so a later save_voice can't change it under us
+        values = np.array(np.load(voice_dir / "embedding.npy", mmap_mode="r"))
+        if values.dtype == np.int8:
+            return cls(values, np.load(voice_dir / "embedding.scale.npy"))
+        return cls(values)
+
+    def write(self, voice_dir: Path):
+        # Scales first: embedding.npy's mtime marks the voice version (see SynthesisCache.key_for)
+        scale_path = voice_dir / "embedding.scale.npy"
+        if self.scale is not None:
+            np.save(scale_path, self.scale)
+        else:
+            scale_path.unlink(missing_ok=True)
+        np.save(voice_dir / "embedding.npy", self.values)
+
+
+class EmbeddingCache:
+    """
+    LRU cache of stored (possibly quantized) voice embeddings, bounded by entry count and total bytes
+
+    invalidate() (called by save_voice and delete_voice) bumps `generation`.
+    A load takes the generation before reading and passes it to put(), which
+    drops the result if a save or delete happened meanwhile (it may be
+    stale); other loads caching their results don't affect it.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, StoredEmbedding]" = OrderedDict()
+        self._bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, voice_id: str) -> Optional[StoredEmbedding]:
+        embedding = self._entries.get(voice_id)
+        if embedding is None:
+            self.misses += 1
+            VOICE_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        self._entries.move_to_end(voice_id)
+        self.hits += 1
+        VOICE_CACHE_LOOKUPS.labels("hit").inc()
+        return embedding
+
+    def put(self, voice_id: str, embedding: StoredEmbedding, generation: Optional[int] = None):
+        """Cache an embedding; with a generation, only if nothing was saved or deleted since"""
+        if generation is not None and generation != self.generation:
+            return
+        self._discard(voice_id)
+        if embedding.nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+
+        # Cached arrays are shared between requests, so make them read-only
+        embedding.values.setflags(write=False)
+        self._entries[voice_id] = embedding
+        self._bytes += embedding.nbytes
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def invalidate(self, voice_id: str):
+        """Drop a voice's entry and make loads already in flight skip caching"""
+        self.generation += 1
+        self._discard(voice_id)
+
+    def _discard(self, voice_id: str):
+        embedding = self._entries.pop(voice_id, None)
+        if embedding is not None:
+            self._bytes -= embedding.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class VoiceCatalog:
+    """
+    SQLite index of voice metadata
+
+    Replaces walking VOICE_LIBRARY_PATH and parsing every metadata.json:
+    listing is paginated and filterable via indexes, and the total count is
+    kept in memory. The per-voice metadata.json files remain the source of
+    truth; rebuild() re-imports them.
+    """
+
+    COLUMNS = ("voice_id", "name", "language", "description", "created_at", "embedding_path", "source_hash")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS voices (
+                    voice_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL COLLATE NOCASE,
+                    language TEXT NOT NULL,
+                    description TEXT,
+                    created_at TEXT NOT NULL,
+                    embedding_path TEXT,
+                    source_hash TEXT
+                )
+            """)
+            # Catalogs created before clone dedup lack source_hash
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(voices)")}
+            if "source_hash" not in columns:
+                self._conn.execute("ALTER TABLE voices ADD COLUMN source_hash TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS voices_source_hash ON voices (source_hash)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS voices_name ON voices (name, voice_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS voices_language_name ON voices (language, name, voice_id)"
+            )
+            self._count = self._conn.execute("SELECT COUNT(*) FROM voices").fetchone()[0]
+
+    def count(self) -> int:
+        """Total number of voices (O(1))"""
+        return self._count
+
+    def upsert(self, metadata: Dict[str, Any]):
+        row = tuple(metadata.get(column) for column in self.COLUMNS)
+        with self._lock, self._conn:
+            exists = self._conn.execute(
+                "SELECT 1 FROM voices WHERE voice_id = ?", (row[0],)
+            ).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO voices ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                row,
+            )
+            if not exists:
+                self._count += 1
+
+    def delete(self, voice_id: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM voices WHERE voice_id = ?", (voice_id,)
+            ).rowcount
+            self._count -= deleted
+        return bool(deleted)
+
+    def get(self, voice_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM voices WHERE voice_id = ?", (voice_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_source_hash(self, source_hash: str, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Voice previously cloned from the same reference audio and transcript (preferring one named name)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM voices WHERE source_hash = ? "
+                "ORDER BY (name = ? COLLATE BINARY) DESC LIMIT 1",
+                (source_hash, name),
+            ).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _where(language: Optional[str], name_prefix: Optional[str]) -> tuple[str, list]:
+        clauses, params = [], []
+        if language:
+            clauses.append("language = ?")
+            params.append(language)
+        if name_prefix:
+            escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"{escaped}%")
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        language: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        where, params = self._where(language, name_prefix)
+        query = f"SELECT * FROM voices {where} ORDER BY name, voice_id LIMIT ? OFFSET ?"
+        params += [limit if limit is not None else -1, offset]
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_matching(self, language: Optional[str] = None, name_prefix: Optional[str] = None) -> int:
+        if not language and not name_prefix:
+            return self._count
+        where, params = self._where(language, name_prefix)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM voices {where}", params).fetchone()[0]
+
+    def rebuild(self, library_path: Path) -> int:
+        """Re-import all per-directory metadata.json files; returns the voice count"""
+        rows = []
+        for voice_dir in library_path.iterdir():
+            metadata_path = voice_dir / "metadata.json"
+            if not voice_dir.is_dir() or not metadata_path.exists():
+                continue
+            try:
+                metadata = json.loads(metadata_path.read_text())
+                VoiceInfo(**metadata)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {metadata_path}: {e}")
+                continue
+            rows.append(tuple(metadata.get(column) for column in self.COLUMNS))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM voices")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO voices ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                rows,
+            )
+            self._count = self._conn.execute("SELECT COUNT(*) FROM voices").fetchone()[0]
+
+        return self._count
+
+
+class EmbeddingMatrix:
+    """
+    All voice embeddings in one memory-mapped matrix
+
+    Each saved voice appends a row to the matrix file and a JSON line to its
+    index log (voice ID, row, shape, precision and int8 scales); opening the
+    library replays the log and maps the file once, instead of opening a
+    file per voice. Re-saving a voice appends a new row and deleting one
+    drops its mapping; compact() reclaims the dead rows once they outnumber
+    the live ones. Embeddings whose size differs from the first one's are
+    not indexed.
+
+    Rows are stored in the dtype of the precision the matrix was created
+    with (float32, float16 or int8); a voice stored at another precision is
+    converted, and then only serves searches, not loads. The per-voice
+    embedding.npy files remain the source of truth; rebuild() re-imports
+    them (and applies a changed precision).
+    """
+
+    DTYPES = {
+        EmbeddingPrecision.FULL: np.float32,
+        EmbeddingPrecision.FLOAT16: np.float16,
+        EmbeddingPrecision.INT8: np.int8,
+    }
+
+    # Rows converted to float32 at a time when searching a float16 / int8 matrix
+    SEARCH_CHUNK_ROWS = 4096
+
+    def __init__(self, path: Path, precision: EmbeddingPrecision = EmbeddingPrecision.FULL):
+        self.path = path
+        self.index_path = path.with_suffix(".index")
+        self.configured_precision = precision
+        self._lock = threading.Lock()
+        self._reset(precision)
+        self._load()
+
+    def _reset(self, precision: EmbeddingPrecision):
+        self.precision = precision
+        self.dtype = np.dtype(self.DTYPES[precision])
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}            # voice_id -> row
+        self._meta: Dict[str, Dict[str, Any]] = {}  # voice_id -> index event
+        self._ids: List[Optional[str]] = []        # row -> voice_id (None = dead row)
+        self._alive = np.zeros(0, dtype=bool)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._matrix: Optional[np.ndarray] = None  # mapped lazily, dropped on append
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        text = self.index_path.read_text()
+        lines = text.splitlines()
+        # A crash mid-append leaves a torn last line
+        repair = not text.endswith("\n") and bool(text)
+        lines = lines[:-1] if repair else lines
+
+        # The header names the row dtype; indexes without one hold float32 rows
+        if lines and "precision" in json.loads(lines[0]) and "id" not in json.loads(lines[0]):
+            self._reset(EmbeddingPrecision(json.loads(lines.pop(0))["precision"]))
+        else:
+            self._reset(EmbeddingPrecision.FULL)
+        for line in lines:
+            self._apply(json.loads(line))
+
+        # Drop rows whose data never made it to disk
+        row_bytes = (self.dim or 0) * self.dtype.itemsize
+        stored_rows = self.path.stat().st_size // row_bytes if row_bytes and self.path.exists() else 0
+        for row in range(stored_rows, len(self._ids)):
+            if self._ids[row] is not None:
+                self._rows.pop(self._ids[row], None)
+                self._meta.pop(self._ids[row], None)
+                repair = True
+        del self._ids[stored_rows:]
+        self._alive = np.array([voice_id is not None for voice_id in self._ids], dtype=bool)
+        self._norms = self._row_norms()
+
+        if self.precision != self.configured_precision:
+            logger.warning(
+                f"Voice embedding matrix holds {self.precision.value} rows but "
+                f"VOICE_EMBEDDING_PRECISION is {self.configured_precision.value} - "
+                f"run `python main.py rebuild-voice-embeddings` to convert it"
+            )
+        if repair:
+            logger.warning(f"Repairing voice embedding index {self.index_path}")
+            self.compact()
+
+    def _apply(self, event: Dict[str, Any]) -> Optional[int]:
+        """Replay one index event; returns the row it made dead, if any"""
+        voice_id, row = event["id"], event.get("row")
+        old = self._rows.pop(voice_id, None)
+        if old is not None:
+            self._ids[old] = None
+        self._meta.pop(voice_id, None)
+        if row is None:
+            return old
+        if "exact" not in event:
+            # Indexes written before quantized storage: float32 rows, original dtype recorded
+            event = {**event, "precision": "full", "exact": event.get("dtype") in ("float32", "float16")}
+        self.dim = self.dim or int(np.prod(event["shape"]))
+        self._ids.extend([None] * (row + 1 - len(self._ids)))
+        self._ids[row] = voice_id
+        self._rows[voice_id] = row
+        self._meta[voice_id] = event
+        return old
+
+    def _log(self, events: List[Dict[str, Any]]):
+        with open(self.index_path, "a") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({"precision": self.precision.value}) + "\n")
+            f.write("".join(json.dumps(event) + "\n" for event in events))
+
+    def _map(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._ids:
+            self._matrix = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(len(self._ids), self.dim))
+        return self._matrix
+
+    def _float_chunks(self, matrix: np.ndarray):
+        """(start, float32 rows) over the matrix, converting a bounded number of rows at a time"""
+        if self.dtype == np.float32:
+            yield 0, matrix
+            return
+        for start in range(0, len(matrix), self.SEARCH_CHUNK_ROWS):
+            yield start, np.asarray(matrix[start:start + self.SEARCH_CHUNK_ROWS], dtype=np.float32)
+
+    def _row_norms(self) -> np.ndarray:
+        matrix = self._map()
+        norms = np.zeros(len(self._ids), dtype=np.float32)
+        if matrix is not None:
+            for start, rows in self._float_chunks(matrix):
+                norms[start:start + len(rows)] = np.linalg.norm(rows, axis=1)
+        return norms
+
+    def _row_for(self, stored: StoredEmbedding) -> tuple[np.ndarray, Optional[np.ndarray], bool]:
+        """The matrix row for an embedding: (values, int8 scales, exact copy of the stored form)"""
+        if self.precision == EmbeddingPrecision.INT8:
+            if stored.precision == EmbeddingPrecision.INT8:
+                return stored.values, stored.scale, True
+            converted = StoredEmbedding.quantize(stored.dequantize(), EmbeddingPrecision.INT8)
+            return converted.values, converted.scale, False
+        # float32 rows hold float32 and float16 values exactly, float16 rows only float16
+        dtype = stored.values.dtype
+        exact = dtype == np.float16 or (dtype == np.float32 and self.dtype == np.float32)
+        return stored.dequantize().astype(self.dtype), None, exact
+
+    def add(self, voice_id: str, stored: StoredEmbedding) -> bool:
+        """Index a voice's embedding (replacing any previous one); False if its size doesn't fit"""
+        values, scale, exact = self._row_for(stored)
+        vector = np.ascontiguousarray(values, dtype=self.dtype).reshape(-1)
+        with self._lock:
+            if self.dim is not None and vector.size != self.dim:
+                self._remove(voice_id)
+                return False
+            self.dim = vector.size
+            row = len(self._ids)
+            with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+                f.seek(row * self.dim * self.dtype.itemsize)
+                f.write(vector.tobytes())
+            event = {
+                "id": voice_id,
+                "row": row,
+                "shape": list(stored.values.shape),
+                "precision": stored.precision.value,
+                "exact": exact,
+            }
+            if scale is not None:
+                event["scale"] = scale.reshape(-1).tolist()
+            self._log([event])
+            replaced = self._apply(event)
+            self._alive = np.append(self._alive, True)
+            if replaced is not None:
+                self._alive[replaced] = False
+            self._norms = np.append(self._norms, np.float32(np.linalg.norm(vector.astype(np.float32))))
+            self._matrix = None
+            return True
+
+    def remove(self, voice_id: str) -> bool:
+        with self._lock:
+            return self._remove(voice_id)
+
+    def _remove(self, voice_id: str) -> bool:
+        row = self._rows.get(voice_id)
+        if row is None:
+            return False
+        self._log([{"id": voice_id, "row": None}])
+        self._apply({"id": voice_id, "row": None})
+        self._alive[row] = False
+        return True
+
+    def get(self, voice_id: str) -> Optional[StoredEmbedding]:
+        """A voice's stored embedding, if its row is an exact copy of it"""
+        with self._lock:
+            row = self._rows.get(voice_id)
+            if row is None or not self._meta[voice_id]["exact"]:
+                return None
+            event = self._meta[voice_id]
+            values = np.array(self._map()[row]).reshape(event["shape"])
+
+        scale = None
+        if "scale" in event:
+            scale = np.array(event["scale"], dtype=np.float32).reshape(values.shape[:-1] + (1,))
+        return StoredEmbedding(values, scale)
+
+    def search(
+        self,
+        embedding: np.ndarray,
+        limit: int = 10,
+        min_similarity: Optional[float] = None,
+        exclude: tuple = (),
+    ) -> List[tuple[str, float]]:
+        """
+        Most cosine-similar voices as (voice_id, similarity), best first
+
+        int8 rows are compared unscaled: exact for single-vector embeddings,
+        where the scale cancels out of the cosine.
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self.dim is None or query.size != self.dim or not self._rows:
+                return []
+            matrix = self._map()
+            ids = list(self._ids)
+            alive = self._alive.copy()
+            norms = self._norms
+            for voice_id in exclude:
+                if voice_id in self._rows:
+                    alive[self._rows[voice_id]] = False
+
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        similarity = np.empty(len(ids), dtype=np.float32)
+        for start, rows in self._float_chunks(matrix):
+            similarity[start:start + len(rows)] = rows @ query
+        similarity /= np.maximum(norms * query_norm, 1e-12)
+        similarity[~alive] = -np.inf
+        if min_similarity is not None:
+            similarity[similarity < min_similarity] = -np.inf
+
+        count = min(limit, int(np.isfinite(similarity).sum()))
+        if count <= 0:
+            return []
+        top = np.argpartition(-similarity, count - 1)[:count]
+        top = top[np.argsort(-similarity[top])]
+        return [(ids[row], float(similarity[row])) for row in top]
+
+    def compact(self):
+        """Rewrite the matrix and index without dead rows"""
+        with self._lock:
+            matrix = self._map()
+            live = [row for row, voice_id in enumerate(self._ids) if voice_id is not None]
+            events = [
+                {**self._meta[self._ids[row]], "row": new_row}
+                for new_row, row in enumerate(live)
+            ]
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+            (matrix[live] if live else np.zeros(0, dtype=self.dtype)).tofile(tmp_path)
+            tmp_index.write_text("".join(
+                json.dumps(event) + "\n"
+                for event in [{"precision": self.precision.value}, *events]
+            ))
+            os.replace(tmp_path, self.path)
+            os.replace(tmp_index, self.index_path)
+            norms = self._norms[live]
+
+            self._reset(self.precision)
+            for event in events:
+                self._apply(event)
+            self._alive = np.ones(len(events), dtype=bool)
+            self._norms = norms
+
+    def maybe_compact(self):
+        dead = len(self._ids) - len(self._rows)
+        if dead > 64 and dead > len(self._rows):
+            self.compact()
+
+    def rebuild(self, library_path: Path) -> int:
+        """Re-index all per-directory embeddings at the configured precision; returns the voice count"""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self.index_path.unlink(missing_ok=True)
+            self._reset(self.configured_precision)
+        for voice_dir in sorted(path.parent for path in library_path.glob("*/embedding.npy")):
+            try:
+                self.add(voice_dir.name, StoredEmbedding.read(voice_dir))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {voice_dir}: {e}")
+        return len(self)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "voices": len(self._rows),
+            "dead_rows": len(self._ids) - len(self._rows),
+            "dim": self.dim,
+            "precision": self.precision.value,
+            "bytes": len(self._ids) * (self.dim or 0) * self.dtype.itemsize,
+        }
+
+
 class VoiceLibrary:
     """Manage saved voice embeddings"""
 
+    catalog = VoiceCatalog(VOICE_CATALOG_PATH)
+
+    precision = EmbeddingPrecision(VOICE_EMBEDDING_PRECISION)
+
+    embeddings = EmbeddingMatrix(VOICE_MATRIX_PATH, precision)
+
+    embedding_cache = EmbeddingCache(
+        max_entries=VOICE_CACHE_MAX_ENTRIES,
+        max_bytes=VOICE_CACHE_MAX_BYTES,
+    )
+
     @staticmethod
     async def save_voice(
         voice_id: str,
         name: str,
         language: str,
         embedding: np.ndarray,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        source_hash: Optional[str] = None,
     ) -> VoiceInfo:
-        """Save voice embedding to library"""
+        """
+        Save voice embedding to library
+
+        source_hash identifies the reference audio + transcript a cloned
+        voice came from, so re-uploads of the same recording can reuse it.
+        The embedding is stored at VOICE_EMBEDDING_PRECISION.
+        """
         voice_dir = VOICE_LIBRARY_PATH / voice_id
         voice_dir.mkdir(exist_ok=True)
 
-        # Save embedding
+        # Save embedding (loads already reading the old file won't cache it)
         embedding_path = voice_dir / "embedding.npy"
-        np.save(embedding_path, embedding)
+        stored = StoredEmbedding.quantize(np.array(embedding), VoiceLibrary.precision)
+        VoiceLibrary.embedding_cache.invalidate(voice_id)
+        stored.write(voice_dir)
 
         # Save metadata
         metadata = {
@@ -177,281 +1185,2965 @@ class VoiceLibrary:
             "created_at": datetime.utcnow().isoformat(),
             "embedding_path": str(embedding_path),
         }
+        if source_hash:
+            metadata["source_hash"] = source_hash
 
         import json
         metadata_path = voice_dir / "metadata.json"
         async with aiofiles.open(metadata_path, "w") as f:
             await f.write(json.dumps(metadata, indent=2))
 
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, VoiceLibrary.catalog.upsert, metadata)
+        await loop.run_in_executor(None, VoiceLibrary._index_embedding, voice_id, stored)
+        # Cached once the file and matrix row are both current
+        VoiceLibrary.embedding_cache.put(voice_id, stored)
+
         logger.info(f"Saved voice: {voice_id} ({name})")
         return VoiceInfo(**metadata)
 
     @staticmethod
     async def load_voice(voice_id: str) -> Optional[np.ndarray]:
-        """Load voice embedding from library"""
-        embedding_path = VOICE_LIBRARY_PATH / voice_id / "embedding.npy"
-        if not embedding_path.exists():
+        """Load voice embedding from library, dequantized (cached in memory after first use)"""
+        stored = await VoiceLibrary.load_stored(voice_id)
+        return stored.dequantize() if stored is not None else None
+
+    @staticmethod
+    async def load_stored(voice_id: str) -> Optional[StoredEmbedding]:
+        """Load voice embedding in its storage precision (cached in memory after first use)"""
+        stored = VoiceLibrary.embedding_cache.get(voice_id)
+        if stored is not None:
+            return stored
+
+        generation = VoiceLibrary.embedding_cache.generation
+
+        def read():
+            # A row of the shared mapped matrix; the voice's own file if it isn't indexed
+            stored = VoiceLibrary.embeddings.get(voice_id)
+            if stored is not None:
+                return stored
+            try:
+                return StoredEmbedding.read(VOICE_LIBRARY_PATH / voice_id)
+            except FileNotFoundError:
+                return None
+
+        loop = asyncio.get_event_loop()
+        stored = await loop.run_in_executor(None, read)
+        if stored is None:
             return None
 
-        embedding = np.load(embedding_path)
+        VoiceLibrary.embedding_cache.put(voice_id, stored, generation)
         logger.info(f"Loaded voice: {voice_id}")
-        return embedding
+        return stored
 
     @staticmethod
-    async def list_voices() -> List[VoiceInfo]:
-        """List all voices in library"""
-        voices = []
-        import json
+    async def voice_version(voice: Optional[str]) -> Optional[int]:
+        """
+        Version of a cloned / designed voice's embedding (embedding.npy
+        mtime), None for built-in speakers and missing voices
+        """
+        if not voice or not voice.startswith("voice_"):
+            return None
 
-        for voice_dir in VOICE_LIBRARY_PATH.iterdir():
-            if not voice_dir.is_dir():
-                continue
+        def stat():
+            try:
+                return (VOICE_LIBRARY_PATH / voice / "embedding.npy").stat().st_mtime_ns
+            except FileNotFoundError:
+                return None
 
-            metadata_path = voice_dir / "metadata.json"
-            if not metadata_path.exists():
-                continue
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, stat)
+
+    @staticmethod
+    def _index_embedding(voice_id: str, embedding: StoredEmbedding):
+        if not VoiceLibrary.embeddings.add(voice_id, embedding):
+            logger.warning(f"Voice {voice_id} embedding size differs from the library's; not indexed")
+        VoiceLibrary.embeddings.maybe_compact()
+
+    @staticmethod
+    async def find_similar(
+        embedding: np.ndarray,
+        limit: int = 10,
+        min_similarity: Optional[float] = None,
+        exclude: tuple = (),
+    ) -> List[tuple[VoiceInfo, float]]:
+        """Library voices most cosine-similar to an embedding, best first"""
+        def search():
+            results = []
+            matches = VoiceLibrary.embeddings.search(embedding, limit, min_similarity, exclude)
+            for voice_id, similarity in matches:
+                row = VoiceLibrary.catalog.get(voice_id)
+                if row is not None:
+                    results.append((VoiceInfo(**row), similarity))
+            return results
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, search)
 
-            async with aiofiles.open(metadata_path, "r") as f:
-                content = await f.read()
-                metadata = json.loads(content)
-                voices.append(VoiceInfo(**metadata))
+    @staticmethod
+    async def find_near_duplicate(embedding: np.ndarray, exclude: tuple = ()) -> Optional[VoiceInfo]:
+        """An existing voice at least VOICE_DUPLICATE_SIMILARITY similar, if any"""
+        if VOICE_DUPLICATE_SIMILARITY <= 0:
+            return None
+        matches = await VoiceLibrary.find_similar(
+            embedding, limit=1, min_similarity=VOICE_DUPLICATE_SIMILARITY, exclude=exclude
+        )
+        return matches[0][0] if matches else None
+
+    @staticmethod
+    async def list_voices(
+        limit: Optional[int] = None,
+        offset: int = 0,
+        language: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[VoiceInfo]:
+        """List voices in library (paginated, filterable by language and name prefix)"""
+        loop = asyncio.get_event_loop()
+        rows = await loop.run_in_executor(
+            None, VoiceLibrary.catalog.list, limit, offset, language, name_prefix
+        )
+        return [VoiceInfo(**row) for row in rows]
 
-        return voices
+    @staticmethod
+    async def count_voices(
+        language: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> int:
+        """Count voices in library matching the filters"""
+        if not language and not name_prefix:
+            return VoiceLibrary.catalog.count()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, VoiceLibrary.catalog.count_matching, language, name_prefix
+        )
 
     @staticmethod
     async def delete_voice(voice_id: str) -> bool:
         """Delete voice from library"""
         import shutil
+        VoiceLibrary.embedding_cache.invalidate(voice_id)
+        VoiceLibrary.embeddings.remove(voice_id)
+        in_catalog = VoiceLibrary.catalog.delete(voice_id)
         voice_dir = VOICE_LIBRARY_PATH / voice_id
-        if voice_dir.exists():
+        deleted = voice_dir.exists()
+        if deleted:
             shutil.rmtree(voice_dir)
+        # Again, so a load that read the files before they were removed isn't cached
+        VoiceLibrary.embedding_cache.invalidate(voice_id)
+        if deleted:
             logger.info(f"Deleted voice: {voice_id}")
             return True
-        return False
+        return in_catalog
 
 
 # ============================================================================
-# QwenTTS Wrapper
+# Worker Pools
 # ============================================================================
 
-class QwenTTSEngine:
-    """Wrapper around ComfyUI-QwenTTS nodes"""
+class PoolSaturatedError(HTTPException):
+    """Raised when a worker pool's queue is full"""
 
-    def __init__(self):
-        self.models_loaded = {}
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"{pool} queue is full, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
 
-    async def synthesize(
-        self,
-        text: str,
-        language: str = "en",
-        voice: Optional[str] = None,
-        instruction: Optional[str] = None,
-        model: QwenModel = QwenModel.CUSTOM_VOICE_1_7B,
-        max_tokens: int = 1024,
-        temperature: float = 0.7,
+
+# Set (per task) by work that should wait for room in a full pool queue rather than
+# fail with PoolSaturatedError: batch endpoint items and background jobs
+queue_when_full: ContextVar[bool] = ContextVar("queue_when_full", default=False)
+
+
+class WorkerPool:
+    """
+    Bounded thread pool with admission control and priority lanes
+
+    At most `workers` jobs run at once. Further jobs wait in a priority
+    queue (interactive before bulk, FIFO within a lane) holding at most
+    `max_queue` requests; beyond that, run() fails fast with
+    PoolSaturatedError (HTTP 503 + Retry-After), unless the caller set
+    queue_when_full - then it waits outside the queue until there is room
+    in its first half, leaving the second half to callers that can't wait.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        POOL_WORKERS.labels(name).set(self.workers)
+        self.max_queue = max(0, max_queue)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"qwentts-{name}",
+        )
+
+        self._waiting: List[list] = []  # heap of [rank, seq, weight, gate]
+        self._seq = itertools.count()
+        self.active = 0
+        self.queued = 0
+        self.overflow = 0  # requests waiting for room in a full queue
+        self._room_waiters: deque = deque()
+
+        self.completed = 0
+        self.rejected = 0
+        self._recent_waits: deque = deque(maxlen=512)
+        self._recent_runs: deque = deque(maxlen=512)  # (seconds, weight) per job
+
+    async def run(
+        self,
+        fn,
+        *args,
+        priority: Priority = Priority.INTERACTIVE,
+        weight: int = 1,
+    ) -> Any:
+        """
+        Run fn(*args) on the pool once a worker is free
+
+        weight is the number of requests this job carries (e.g. batch size),
+        so the queue bound is expressed in requests rather than jobs.
+        """
+        loop = asyncio.get_event_loop()
+        enqueued_at = time.time()
+
+        # Callers that wait for room only fill half the queue, keeping the rest for
+        # callers that would be rejected; a job heavier than that goes in once it is empty
+        wait = queue_when_full.get()
+        limit = self.max_queue // 2 if wait else self.max_queue
+        while self.active >= self.workers and self.queued + weight > limit:
+            if not wait:
+                self.rejected += weight
+                POOL_REJECTED.labels(self.name).inc(weight)
+                raise PoolSaturatedError(self.name, self.retry_after())
+            if not self.queued:
+                break
+            room = loop.create_future()
+            self._room_waiters.append(room)
+            self.overflow += weight
+            try:
+                await room
+            finally:
+                self.overflow -= weight
+
+        if self.active >= self.workers:
+            gate = loop.create_future()
+            entry = [priority.rank, next(self._seq), weight, gate]
+            heapq.heappush(self._waiting, entry)
+            self.queued += weight
+            try:
+                await gate
+            except asyncio.CancelledError:
+                if gate.done() and not gate.cancelled():
+                    # A worker slot was handed to us just before cancellation
+                    self._release()
+                else:
+                    self.queued -= entry[2]
+                    entry[2] = 0
+                    self._wake_room_waiters()
+                raise
+        else:
+            self.active += 1
+
+        started_at = time.time()
+        self._recent_waits.append(started_at - enqueued_at)
+        QUEUE_WAIT.labels(self.name, priority.value).observe(started_at - enqueued_at)
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+        finally:
+            self._recent_runs.append((time.time() - started_at, weight))
+            self.completed += weight
+            self._release()
+
+    def _release(self):
+        """Hand the freed worker slot to the highest-priority waiter"""
+        try:
+            while self._waiting:
+                _, _, weight, gate = heapq.heappop(self._waiting)
+                self.queued -= weight
+                if not gate.done():
+                    gate.set_result(None)
+                    return
+            self.active -= 1
+        finally:
+            self._wake_room_waiters()
+
+    def _wake_room_waiters(self):
+        """Let callers waiting for queue room re-check (in arrival order)"""
+        while self._room_waiters:
+            room = self._room_waiters.popleft()
+            if not room.done():
+                room.set_result(None)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain"""
+        avg_run = (
+            sum(seconds for seconds, _ in self._recent_runs) / len(self._recent_runs)
+            if self._recent_runs else 1.0
+        )
+        return max(1, int((self.queued + self.overflow + self.active) * avg_run / self.workers + 0.999))
+
+    def expected_wait(self) -> float:
+        """Seconds a request submitted now would wait for a worker"""
+        if self.active < self.workers:
+            return 0.0
+        runs = list(self._recent_runs)
+        per_request = (
+            sum(seconds for seconds, _ in runs) / max(1, sum(weight for _, weight in runs))
+            if runs else 1.0
+        )
+        return (self.queued + self.overflow + 1) * per_request / self.workers
+
+    def update_gauges(self):
+        POOL_ACTIVE.labels(self.name).set(self.active)
+        POOL_QUEUE_DEPTH.labels(self.name).set(self.queued)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._recent_waits)
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_for_room": self.overflow,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+        }
+
+
+# ============================================================================
+# Single-Flight
+# ============================================================================
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running await the same result instead of starting their own.
+    The key is forgotten as soon as the work finishes, so this only covers
+    the in-flight window (the synthesis cache covers the rest). Work runs
+    in its own task, so a caller disconnecting does not cancel it for the
+    others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn, *args, **kwargs) -> tuple[Any, bool]:
+        """
+        Run fn(*args, **kwargs) once per in-flight key
+
+        Returns:
+            (result, shared) - shared is True when another caller's run was reused
+        """
+        future = self._inflight.get(key)
+        shared = future is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(future), shared
+
+    def running(self, key: str) -> Optional[asyncio.Future]:
+        """The in-flight work for a key, if any (it outlives callers that were cancelled)"""
+        return self._inflight.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+# ============================================================================
+# Synthesis Cache
+# ============================================================================
+
+@dataclass
+class CachedAudio:
+    audio_bytes: bytes
+    sample_rate: int
+    duration_ms: int
+
+
+class SynthesisCache:
+    """
+    Content-addressed cache of encoded synthesis results
+
+    Two tiers: a byte-bounded in-memory LRU, backed by a directory on disk
+    with size-based eviction (least recently used first). Keys are a
+    canonical hash of every request field that affects the audio. put()
+    stores in memory at once and writes to disk in the background.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        memory_bytes: int,
+        disk_bytes: int,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+
+        self._memory: "OrderedDict[str, CachedAudio]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._disk_scanned = False
+        self._disk_scan: Optional[asyncio.Future] = None
+        self._disk_writes: set = set()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def cacheable(request: "SynthesizeRequest") -> bool:
+        """Sampled output is only reproducible (and so cacheable) with a seed"""
+        return request.use_cache and (not request.do_sample or request.seed is not None)
+
+    @staticmethod
+    async def key_for(request: "SynthesizeRequest", **extra) -> str:
+        """Canonical hash of the request fields that determine the audio"""
+        fields = {
+            "text": request.text,
+            "language": request.language,
+            "voice": request.voice,
+            "instruction": request.instruction,
+            "model": request.model.value,
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "do_sample": request.do_sample,
+            "seed": request.seed,
+            "format": request.format.value,
+            "sample_rate": request.sample_rate,
+        }
+
+        if request.postprocess is not None:
+            fields["postprocess"] = request.postprocess.model_dump(mode="json")
+
+        # Re-saving a cloned voice changes its embedding, so key on its version too
+        if request.voice and request.voice.startswith("voice_"):
+            fields["voice_version"] = await VoiceLibrary.voice_version(request.voice)
+
+        fields.update(extra)
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> tuple[Optional[CachedAudio], str]:
+        """Look up a result; returns (entry, tier) where tier is memory, disk or miss"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry, "memory"
+
+        await self._scan_disk()
+        if key in self._disk:
+            loop = asyncio.get_event_loop()
+            entry = await loop.run_in_executor(None, self._read_disk, key)
+            if entry is not None:
+                self._disk.move_to_end(key)
+                self._remember(key, entry)
+                self.disk_hits += 1
+                return entry, "disk"
+            self._forget_disk(key)
+
+        self.misses += 1
+        return None, "miss"
+
+    def put(self, key: str, entry: CachedAudio):
+        """Store a result in memory now and on disk in the background"""
+        self._remember(key, entry)
+        task = asyncio.ensure_future(self._put_disk(key, entry))
+        self._disk_writes.add(task)
+        task.add_done_callback(self._disk_writes.discard)
+
+    async def flush(self):
+        """Wait for background disk writes to finish"""
+        if self._disk_writes:
+            await asyncio.gather(*self._disk_writes, return_exceptions=True)
+
+    async def _put_disk(self, key: str, entry: CachedAudio):
+        await self._scan_disk()
+        loop = asyncio.get_event_loop()
+        try:
+            size = await loop.run_in_executor(None, self._write_disk, key, entry)
+        except OSError as e:
+            logger.warning(f"Synthesis cache write failed: {e}")
+            return
+
+        self._forget_disk(key)
+        self._disk[key] = size
+        self._disk_used += size
+
+        evicted = []
+        while self._disk_used > self.disk_bytes and len(self._disk) > 1:
+            old_key, _ = next(iter(self._disk.items()))
+            self._forget_disk(old_key)
+            evicted.append(old_key)
+        if evicted:
+            await loop.run_in_executor(None, self._delete_disk, evicted)
+
+    def _remember(self, key: str, entry: CachedAudio):
+        size = len(entry.audio_bytes)
+        if size > self.memory_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old.audio_bytes)
+
+        self._memory[key] = entry
+        self._memory_used += size
+
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted.audio_bytes)
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_used -= size
+
+    def _file_paths(self, key: str) -> tuple[Path, Path]:
+        directory = self.path / key[:2]
+        return directory / f"{key}.audio", directory / f"{key}.json"
+
+    async def _scan_disk(self):
+        """Index existing disk entries once, oldest access first (concurrent callers share the scan)"""
+        if self._disk_scanned:
+            return
+        if self._disk_scan is None:
+            self._disk_scan = asyncio.ensure_future(self._index_disk())
+        try:
+            await asyncio.shield(self._disk_scan)
+        except Exception:
+            self._disk_scan = None  # retried by the next lookup
+            raise
+
+    async def _index_disk(self):
+        def scan():
+            entries = []
+            for audio_path in self.path.glob("*/*.audio"):
+                try:
+                    stat = audio_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, audio_path.stem, stat.st_size))
+            return sorted(entries)
+
+        loop = asyncio.get_event_loop()
+        for _, key, size in await loop.run_in_executor(None, scan):
+            self._disk[key] = size
+            self._disk_used += size
+        self._disk_scanned = True
+
+    def _read_disk(self, key: str) -> Optional[CachedAudio]:
+        audio_path, meta_path = self._file_paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            audio_bytes = audio_path.read_bytes()
+            os.utime(audio_path)  # mark as recently used for eviction order
+        except (OSError, ValueError):
+            return None
+        return CachedAudio(audio_bytes=audio_bytes, **meta)
+
+    def _write_disk(self, key: str, entry: CachedAudio) -> int:
+        audio_path, meta_path = self._file_paths(key)
+        audio_path.parent.mkdir(exist_ok=True)
+
+        meta_path.write_text(json.dumps({
+            "sample_rate": entry.sample_rate,
+            "duration_ms": entry.duration_ms,
+        }))
+        # Write then rename so readers never see a partial file
+        temp_path = audio_path.with_suffix(".tmp")
+        temp_path.write_bytes(entry.audio_bytes)
+        temp_path.replace(audio_path)
+        return len(entry.audio_bytes)
+
+    def _delete_disk(self, keys: List[str]):
+        for key in keys:
+            for path in self._file_paths(key):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_used,
+        }
+
+
+# ============================================================================
+# Model Residency
+# ============================================================================
+
+# Approximate resident footprint per model (bf16 weights + tokenizer + activations), in MB
+MODEL_MEMORY_ESTIMATE_MB = {
+    QwenModel.CUSTOM_VOICE_1_7B.value: 4500,
+    QwenModel.CUSTOM_VOICE_0_6B.value: 1800,
+    QwenModel.VOICE_DESIGN_1_7B.value: 4500,
+    QwenModel.BASE_1_7B.value: 4500,
+    QwenModel.BASE_0_6B.value: 1800,
+}
+DEFAULT_MODEL_MEMORY_MB = 4500
+
+
+def node_concurrency(node: Any) -> int:
+    """Concurrent calls allowed into a node: NODE_CONCURRENCY if it declares THREAD_SAFE, else 1"""
+    if getattr(node, "THREAD_SAFE", False):
+        return max(1, NODE_CONCURRENCY)
+    if NODE_CONCURRENCY > 1:
+        logger.warning(f"{type(node).__name__} is not thread-safe - ignoring NODE_CONCURRENCY={NODE_CONCURRENCY}")
+    return 1
+
+
+@dataclass
+class ResidentNode:
+    node: Any
+    memory_mb: int
+    load_seconds: float
+    # Held while calling into the node; bounds concurrent calls to node_concurrency()
+    lock: threading.BoundedSemaphore
+    uses: int = 0
+    # Callers between acquire() and release(); busy nodes are never evicted
+    in_use: int = 0
+
+
+class ModelResidency:
+    """
+    Keep warm ComfyUI node instances per (node, model)
+
+    Nodes are created (and their model loaded) once and reused across
+    requests. When loading another model would exceed the memory budget,
+    the least recently used idle models are evicted first. Loads run
+    outside the residency lock, so requests for models that are already
+    resident never wait behind one; callers wanting a model that is being
+    loaded wait for that load instead of starting their own.
+    """
+
+    def __init__(self, budget_mb: int):
+        self.budget_mb = budget_mb
+        self._resident: "OrderedDict[tuple, ResidentNode]" = OrderedDict()
+        self._loading: Dict[tuple, threading.Event] = {}
+        self._reserved_mb: Dict[tuple, int] = {}  # memory of models being loaded
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds: Dict[str, float] = {}
+
+    @property
+    def used_mb(self) -> int:
+        return sum(entry.memory_mb for entry in self._resident.values())
+
+    @contextmanager
+    def use(self, node_kind: str, model_name: Optional[str] = None):
+        """A warm node for the duration of the block (blocking; call off the event loop)"""
+        entry = self.acquire(node_kind, model_name)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+
+    def acquire(self, node_kind: str, model_name: Optional[str] = None) -> ResidentNode:
+        """
+        Get a warm node, loading it on first use (blocking; call off the
+        event loop). Pair with release(), or use use().
+        """
+        key = (node_kind, model_name)
+
+        while True:
+            with self._lock:
+                entry = self._resident.get(key)
+                if entry is not None:
+                    self._resident.move_to_end(key)
+                    entry.uses += 1
+                    entry.in_use += 1
+                    return entry
+                loading = self._loading.get(key)
+                if loading is None:
+                    # This caller loads it; others asking for the same node wait for the load
+                    loading = self._loading[key] = threading.Event()
+                    memory_mb = MODEL_MEMORY_ESTIMATE_MB.get(model_name, DEFAULT_MODEL_MEMORY_MB)
+                    evicted = self._make_room(memory_mb)
+                    self._reserved_mb[key] = memory_mb
+                    break
+            # Woken when the load finishes (or fails, and one of the waiters retries)
+            loading.wait()
+
+        try:
+            for evicted_key, evicted_entry in evicted:
+                self._unload(evicted_key, evicted_entry)
+
+            start_time = time.time()
+            node = QWEN_NODES[node_kind]()
+            if model_name and hasattr(node, "load_model"):
+                node.load_model(model_name)
+            load_seconds = time.time() - start_time
+        except BaseException:
+            with self._lock:
+                self._loading.pop(key)
+                self._reserved_mb.pop(key)
+            loading.set()
+            raise
+
+        entry = ResidentNode(
+            node=node,
+            memory_mb=memory_mb,
+            load_seconds=load_seconds,
+            lock=threading.BoundedSemaphore(node_concurrency(node)),
+            uses=1,
+            in_use=1,
+        )
+        with self._lock:
+            self._resident[key] = entry
+            self._loading.pop(key)
+            self._reserved_mb.pop(key)
+            self.loads += 1
+            self.load_seconds[f"{node_kind}:{model_name or 'default'}"] = round(load_seconds, 3)
+        loading.set()
+        MODEL_LOAD_DURATION.labels(node_kind, model_name or "default").observe(load_seconds)
+
+        logger.info(f"Loaded {node_kind} ({model_name or 'default'}) in {load_seconds:.2f}s")
+        return entry
+
+    def release(self, entry: ResidentNode):
+        with self._lock:
+            entry.in_use -= 1
+
+    def _make_room(self, memory_mb: int) -> List[tuple]:
+        """
+        Take least recently used idle models out of the residency until
+        memory_mb more fits the budget (call with the lock held); returns
+        them for _unload, which runs outside the lock
+        """
+        evicted = []
+        needed = self.used_mb + sum(self._reserved_mb.values()) + memory_mb - self.budget_mb
+        for key, entry in list(self._resident.items()):
+            if needed <= 0:
+                break
+            if entry.in_use:
+                continue
+            del self._resident[key]
+            evicted.append((key, entry))
+            needed -= entry.memory_mb
+        if needed > 0:
+            logger.warning(f"Models in use need {needed} MB more than MODEL_MEMORY_BUDGET_MB allows")
+        return evicted
+
+    def _unload(self, key: tuple, entry: ResidentNode):
+        node_kind, model_name = key
+        if hasattr(entry.node, "unload_model"):
+            try:
+                entry.node.unload_model()
+            except Exception as e:
+                logger.warning(f"Unload failed for {node_kind} ({model_name}): {e}")
+
+        with self._lock:
+            self.evictions += 1
+        MODEL_EVICTIONS.labels(node_kind, model_name or "default").inc()
+        del entry
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+        logger.info(f"Evicted {node_kind} ({model_name or 'default'}) from memory")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_mb": self.budget_mb,
+            "used_mb": self.used_mb,
+            "resident": [
+                {
+                    "node": node_kind,
+                    "model": model_name,
+                    "memory_mb": entry.memory_mb,
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "uses": entry.uses,
+                    "in_use": entry.in_use,
+                }
+                for (node_kind, model_name), entry in list(self._resident.items())
+            ],
+            "loading": [f"{node_kind}:{model_name or 'default'}" for node_kind, model_name in list(self._loading)],
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "load_seconds": self.load_seconds,
+        }
+
+
+# ============================================================================
+# Token Budget
+# ============================================================================
+
+# Codec frames per second of audio for the 12 Hz Qwen3-TTS models
+CODEC_TOKENS_PER_SECOND = 12
+
+# Starting tokens-per-character before any generations are observed
+# (speech rate ~15 chars/s for alphabetic scripts, ~5 chars/s for CJK)
+TOKENS_PER_CHAR_PRIOR = {"zh": 2.4, "ja": 2.4, "ko": 2.0}
+DEFAULT_TOKENS_PER_CHAR_PRIOR = 0.8
+
+
+@dataclass
+class TokenRate:
+    """Running tokens-per-character estimate for one (model, language)"""
+    mean: float
+    var: float
+    samples: int = 0
+    truncations: int = 0
+
+
+class TokenBudget:
+    """
+    Learn tokens generated per character, per model and language, and size
+    max_new_tokens from it
+
+    Every generation updates an exponentially weighted mean and variance
+    of tokens/char for its (model, language). Requests without max_tokens
+    get chars x (mean + k std) x (1 + margin), rounded up to a multiple of
+    QUANTUM tokens so budgets still batch together. Estimates start
+    from a per-script prior with a wide variance and narrow as samples
+    arrive. The table is saved to TOKEN_CALIBRATION_PATH every SAVE_EVERY
+    samples, off the event loop.
+    """
+
+    QUANTUM = 64
+    ALPHA = 0.05  # EWMA weight of each new sample
+    SAVE_EVERY = 50
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._rates: Dict[tuple, TokenRate] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._save_queued = False
+        self._load()
+
+    def _prior(self, language: str) -> TokenRate:
+        mean = TOKENS_PER_CHAR_PRIOR.get(language, DEFAULT_TOKENS_PER_CHAR_PRIOR)
+        return TokenRate(mean=mean, var=(mean * 0.5) ** 2)
+
+    def _rate(self, model: str, language: str) -> TokenRate:
+        key = (model, language)
+        rate = self._rates.get(key)
+        if rate is None:
+            rate = self._rates[key] = self._prior(language)
+        return rate
+
+    def budget(self, model: str, language: str, text: str) -> int:
+        """max_new_tokens for a text with no explicit max_tokens"""
+        with self._lock:
+            rate = self._rate(model, language)
+            ratio = rate.mean + TOKEN_BUDGET_STD_MARGIN * rate.var ** 0.5
+
+        # One extra second of frames covers leading/trailing silence
+        tokens = len(text) * ratio * (1 + TOKEN_BUDGET_MARGIN) + CODEC_TOKENS_PER_SECOND
+        tokens = int(-(-tokens // self.QUANTUM) * self.QUANTUM)
+        return max(TOKEN_BUDGET_MIN, min(TOKEN_BUDGET_MAX, tokens))
+
+    def observe(self, model: str, language: str, text: str, tokens: int, max_tokens: int):
+        """Record one finished generation"""
+        if not text:
+            return
+        truncated = tokens >= max_tokens
+        if truncated:
+            GENERATIONS_TRUNCATED.labels(model=model, language=language_label(language)).inc()
+
+        with self._lock:
+            rate = self._rate(model, language)
+            if truncated:
+                # A cut-off generation only says the ratio is at least this high
+                rate.truncations += 1
+                observed = max(tokens / len(text), rate.mean)
+            else:
+                observed = tokens / len(text)
+
+            delta = observed - rate.mean
+            rate.mean += self.ALPHA * delta
+            rate.var = (1 - self.ALPHA) * (rate.var + self.ALPHA * delta * delta)
+            rate.samples += 1
+
+            self._unsaved += 1
+            if self._unsaved < self.SAVE_EVERY:
+                return
+            self._unsaved = 0
+            # A save still waiting to start writes the latest table anyway
+            if self._save_queued:
+                return
+            self._save_queued = True
+
+        asyncio.get_event_loop().run_in_executor(None, self._save_queued_table)
+
+    def table(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._table()
+
+    def _table(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "model": model,
+                "language": language,
+                "samples": rate.samples,
+                "tokens_per_char": round(rate.mean, 4),
+                "std": round(rate.var ** 0.5, 4),
+                "budget_tokens_per_char": round(
+                    (rate.mean + TOKEN_BUDGET_STD_MARGIN * rate.var ** 0.5) * (1 + TOKEN_BUDGET_MARGIN), 4
+                ),
+                "truncations": rate.truncations,
+            }
+            for (model, language), rate in sorted(self._rates.items())
+        ]
+
+    def save(self):
+        with self._save_lock:
+            self._save(self.table())
+
+    def _save_queued_table(self):
+        with self._lock:
+            self._save_queued = False
+        self.save()
+
+    def _save(self, snapshot: List[Dict[str, Any]]):
+        try:
+            temp_path = self.path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps(snapshot, indent=2))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save token calibration: {e}")
+
+    def _load(self):
+        try:
+            rows = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring token calibration {self.path}: {e}")
+            return
+
+        for row in rows:
+            self._rates[(row["model"], row["language"])] = TokenRate(
+                mean=row["tokens_per_char"],
+                var=row["std"] ** 2,
+                samples=row["samples"],
+                truncations=row.get("truncations", 0),
+            )
+        logger.info(f"Loaded token calibration for {len(rows)} model/language pairs")
+
+
+# ============================================================================
+# Model Routing
+# ============================================================================
+
+class ModelRouter:
+    """
+    Resolve model "auto" to a concrete model by synthesis queue pressure
+
+    While the synthesis pool's expected queue wait is within
+    AUTO_MODEL_SLO_MS, "auto" gets the 1.7B model; above it, the faster
+    0.6B sibling, which drains the queue sooner. Switching back waits until
+    the expected wait falls below AUTO_MODEL_RECOVER_RATIO x SLO, so the
+    choice doesn't flap around the threshold.
+    """
+
+    LARGE = QwenModel.CUSTOM_VOICE_1_7B
+    SMALL = QwenModel.CUSTOM_VOICE_0_6B
+
+    def __init__(self, pool: WorkerPool, slo_ms: float, recover_ratio: float):
+        self.pool = pool
+        self.slo_ms = slo_ms
+        self.recover_ratio = recover_ratio
+        self.degraded = False
+        self.switches = 0
+        self.routed = {self.LARGE.value: 0, self.SMALL.value: 0}
+
+    def expected_wait_ms(self) -> float:
+        return self.pool.expected_wait() * 1000
+
+    def route(self) -> QwenModel:
+        wait_ms = self.expected_wait_ms()
+
+        if not self.degraded and wait_ms > self.slo_ms:
+            self.degraded = True
+            self.switches += 1
+            logger.warning(
+                f"Expected queue wait {wait_ms:.0f}ms over {self.slo_ms:.0f}ms SLO - "
+                f"routing \"auto\" to {self.SMALL.value}"
+            )
+        elif self.degraded and wait_ms < self.slo_ms * self.recover_ratio:
+            self.degraded = False
+            self.switches += 1
+            logger.info(f"Expected queue wait {wait_ms:.0f}ms - routing \"auto\" to {self.LARGE.value}")
+        AUTO_MODEL_DEGRADED.set(int(self.degraded))
+
+        model = self.SMALL if self.degraded else self.LARGE
+        self.routed[model.value] += 1
+        AUTO_MODEL_ROUTES.labels(model.value).inc()
+        return model
+
+    def resolve(self, request: "SynthesizeRequest") -> "SynthesizeRequest":
+        """The request with model "auto" replaced by the routed model"""
+        if request.model != QwenModel.AUTO:
+            return request
+        return request.model_copy(update={"model": self.route()})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slo_ms": self.slo_ms,
+            "expected_wait_ms": round(self.expected_wait_ms(), 1),
+            "degraded": self.degraded,
+            "switches": self.switches,
+            "routed": self.routed,
+        }
+
+
+# ============================================================================
+# QwenTTS Wrapper
+# ============================================================================
+
+class QwenTTSEngine:
+    """Wrapper around ComfyUI-QwenTTS nodes"""
+
+    def __init__(self):
+        self.residency = ModelResidency(budget_mb=MODEL_MEMORY_BUDGET_MB)
+        self.pools = {
+            "synthesis": WorkerPool("synthesis", SYNTH_POOL_WORKERS, SYNTH_POOL_MAX_QUEUE),
+            "clone": WorkerPool("clone", CLONE_POOL_WORKERS, CLONE_POOL_MAX_QUEUE),
+            "design": WorkerPool("design", DESIGN_POOL_WORKERS, DESIGN_POOL_MAX_QUEUE),
+        }
+        self.single_flight = SingleFlight()
+        self.token_budget = TokenBudget(TOKEN_CALIBRATION_PATH)
+        self.router = ModelRouter(
+            self.pools["synthesis"],
+            AUTO_MODEL_SLO_MS,
+            AUTO_MODEL_RECOVER_RATIO,
+        )
+
+    async def synthesize(
+        self,
+        text: str,
+        language: str = "en",
+        voice: Optional[str] = None,
+        instruction: Optional[str] = None,
+        model: QwenModel = QwenModel.CUSTOM_VOICE_1_7B,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
         do_sample: bool = False,
+        seed: Optional[int] = None,
+        priority: Optional[Priority] = None,
     ) -> tuple[np.ndarray, int]:
         """
         Synthesize speech from text
 
+        Without max_tokens, the budget comes from the learned tokens-per-char
+        for this model and language (see TokenBudget).
+
+        Deterministic requests (no sampling, or sampling with a seed) that
+        match one already in flight share its generation. The returned array
+        may then be shared between callers, so treat it as read-only.
+
         Returns:
             (audio_array, sample_rate)
         """
-        if not COMFYUI_AVAILABLE:
-            raise RuntimeError("ComfyUI not available")
+        if model == QwenModel.AUTO:
+            model = self.router.route()
+
+        args = (text, language, voice, instruction, model, max_tokens, temperature, do_sample, seed, priority)
+        if do_sample and seed is None:
+            return await self._synthesize(*args)
+
+        fields = {
+            "text": text,
+            "language": language,
+            "voice": voice,
+            "instruction": instruction,
+            "model": model.value,
+            "max_tokens": max_tokens,
+            "temperature": temperature if do_sample else None,
+            "do_sample": do_sample,
+            "seed": seed,
+            # A re-saved voice must not join a generation using its old embedding
+            "voice_version": await VoiceLibrary.voice_version(voice),
+        }
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+        wait_start = time.perf_counter()
+        try:
+            result, shared = await self.single_flight.do(key, self._synthesize, *args)
+        except PoolSaturatedError:
+            if not queue_when_full.get():
+                raise
+            # The generation this joined was turned away; wait for room with our own
+            return await self._synthesize(*args)
+        if shared:
+            COALESCED_REQUESTS.labels(model=model.value).inc()
+            # The generation's own stages were recorded on the request that started it
+            timings = current_timings.get()
+            if timings is not None:
+                timings.add("coalesced", time.perf_counter() - wait_start)
+        return result
+
+    async def _synthesize(
+        self,
+        text: str,
+        language: str = "en",
+        voice: Optional[str] = None,
+        instruction: Optional[str] = None,
+        model: QwenModel = QwenModel.CUSTOM_VOICE_1_7B,
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        do_sample: bool = False,
+        seed: Optional[int] = None,
+        priority: Optional[Priority] = None,
+        embedding: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, int]:
+        """
+        Synthesize without coalescing (see synthesize)
+
+        embedding overrides the library's embedding for a cloned voice.
+        """
+        if not BACKEND_AVAILABLE:
+            raise RuntimeError(f"TTS backend '{TTS_BACKEND}' not available")
 
         # Select node based on whether we have a voice ID or custom voice
         if voice and voice.startswith("voice_"):
             # Load voice embedding from library
-            embedding = await VoiceLibrary.load_voice(voice)
+            if embedding is None:
+                with timed_stage("embedding"):
+                    embedding = await VoiceLibrary.load_voice(voice)
             if embedding is None:
                 raise HTTPException(status_code=404, detail=f"Voice {voice} not found")
 
             # Use VoiceClone node with embedding
-            node_class = QWEN_NODES['VoiceClone']
+            node_kind = 'VoiceClone'
         else:
             # Use CustomVoice node
-            node_class = QWEN_NODES['CustomVoice']
+            node_kind = 'CustomVoice'
             if voice is None:
                 voice = CustomVoice.VOICE_1
 
-        # Initialize node
-        node = node_class()
+        budget_source = "request"
+        if max_tokens is None:
+            max_tokens = self.token_budget.budget(model.value, language, text)
+            budget_source = "calibrated"
+        TOKEN_BUDGET.labels(model=model.value, source=budget_source).observe(max_tokens)
+
+        # Prepare inputs based on model type
+        inputs = {
+            "text": text,
+            "model_name": model.value,
+            "max_new_tokens": max_tokens,
+            "temperature": temperature,
+            "do_sample": do_sample,
+        }
+
+        if instruction:
+            inputs["instruction"] = instruction
+
+        if seed is not None:
+            inputs["seed"] = seed
+
+        if voice and not voice.startswith("voice_"):
+            # Custom voice (1-9)
+            inputs["speaker"] = voice
+        elif embedding is not None:
+            # Cloned / designed voice
+            inputs["voice_embedding"] = embedding
+
+        # Run synthesis (the node generates one text per call)
+        if priority is None:
+            priority = Priority.INTERACTIVE if len(text) <= INTERACTIVE_MAX_CHARS else Priority.BULK
+        submitted = time.perf_counter()
+        result = await self._generate(node_kind, model.value, inputs, priority)
+
+        # Node and generate times come back with the result; the rest of the wait is queueing
+        stages = result.pop("stage_timings", {})
+        timings = current_timings.get()
+        if timings is not None:
+            waited_ms = (time.perf_counter() - submitted) * 1000
+            timings.merge({"queue": max(0.0, waited_ms - sum(stages.values())), **stages})
+
+        # Extract audio
+        audio_array = result.get("audio")
+        sample_rate = result.get("sample_rate", 24000)
+
+        # Nodes that don't report their token count: infer it from the audio length
+        tokens = result.get("num_tokens")
+        if tokens is None and audio_array is not None:
+            tokens = round(len(audio_array) / sample_rate * CODEC_TOKENS_PER_SECOND)
+        if tokens is not None:
+            self.token_budget.observe(model.value, language, text, tokens, max_tokens)
+
+        return audio_array, sample_rate
+
+    async def _generate(
+        self,
+        node_kind: str,
+        model_name: str,
+        inputs: Dict[str, Any],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Dict[str, Any]:
+        """Run one generation on a warm node instance in the synthesis pool"""
+        stages: Dict[str, float] = {}
+
+        def run():
+            start = time.perf_counter()
+            with self.residency.use(node_kind, model_name) as resident, resident.lock:
+                # Lock wait counts as node time: the node is busy with another call
+                generate_start = time.perf_counter()
+                stages["node"] = (generate_start - start) * 1000
+                try:
+                    return resident.node.generate(**inputs)
+                finally:
+                    stages["generate"] = (time.perf_counter() - generate_start) * 1000
+
+        result = await self.pools["synthesis"].run(run, priority=priority)
+        return {**result, "stage_timings": stages} if isinstance(result, dict) else result
+
+    async def _call_node(self, pool: str, node_kind: str, model: QwenModel, method: str, *args) -> Any:
+        """Call a method on a warm node instance (with the model loaded) in the given worker pool"""
+        def run():
+            with self.residency.use(node_kind, model.value) as resident, resident.lock:
+                return getattr(resident.node, method)(*args)
+
+        return await self.pools[pool].run(run, priority=Priority.BULK)
+
+    async def clone_voice(
+        self,
+        audio_path: str,
+        transcript: str,
+        language: str = "en",
+        model: QwenModel = QwenModel.BASE_1_7B,
+    ) -> np.ndarray:
+        """
+        Clone voice from audio sample (with a Base model)
+
+        Returns:
+            Voice embedding
+        """
+        if not BACKEND_AVAILABLE:
+            raise RuntimeError(f"TTS backend '{TTS_BACKEND}' not available")
+
+        # Create voice embedding
+        result = await self._call_node(
+            'clone',
+            'VoiceClone',
+            model,
+            'create_voice',
+            audio_path,
+            transcript,
+            language
+        )
+
+        embedding = result.get("embedding")
+        return embedding
+
+    async def design_voice(
+        self,
+        description: str,
+        language: str = "en",
+        model: QwenModel = QwenModel.VOICE_DESIGN_1_7B,
+    ) -> np.ndarray:
+        """
+        Design voice from natural language description
+
+        Returns:
+            Voice embedding
+        """
+        if not BACKEND_AVAILABLE:
+            raise RuntimeError(f"TTS backend '{TTS_BACKEND}' not available")
+
+        result = await self._call_node(
+            'design',
+            'VoiceDesign',
+            model,
+            'design_voice',
+            description,
+            language
+        )
+
+        embedding = result.get("embedding")
+        return embedding
+
+
+# Global engine instance
+engine = QwenTTSEngine()
+
+# Global synthesis result cache
+synthesis_cache = SynthesisCache(
+    path=SYNTH_CACHE_PATH,
+    memory_bytes=SYNTH_CACHE_MEMORY_BYTES,
+    disk_bytes=SYNTH_CACHE_DISK_BYTES,
+    enabled=SYNTH_CACHE_ENABLED,
+)
+
+
+# ============================================================================
+# Audio Utilities
+# ============================================================================
+
+# Sentence ends (Latin and CJK punctuation), then clause breaks for long sentences
+SENTENCE_PATTERN = re.compile(r".+?(?:[.!?।]+[\"'”」)]*(?=\s|$)|[。！？]+[\"'”」)]*|$)", re.S)
+CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:、，；：])\s*")
+
+
+# CJK scripts carry more speech per character, so their segments are shorter
+SEGMENT_MAX_CHARS_BY_LANGUAGE = {"zh": 80, "ja": 80, "ko": 120}
+
+
+def segment_max_chars(language: str) -> int:
+    return min(
+        STREAM_SEGMENT_MAX_CHARS,
+        SEGMENT_MAX_CHARS_BY_LANGUAGE.get(language, STREAM_SEGMENT_MAX_CHARS),
+    )
+
+
+def split_text(text: str, max_chars: int = STREAM_SEGMENT_MAX_CHARS) -> List[str]:
+    """
+    Split text into speakable segments at sentence boundaries
+
+    Sentences longer than max_chars are further split at clause boundaries,
+    and as a last resort at whitespace.
+    """
+    return [segment for segment, _ in split_text_spans(text, max_chars)]
+
+
+def split_text_spans(text: str, max_chars: int = STREAM_SEGMENT_MAX_CHARS) -> List[tuple]:
+    """
+    split_text's segments as (segment, end) pairs, end being the offset in
+    text just past the segment - segments are whitespace-normalized, so
+    they can't be searched for in text
+    """
+    segments = []
+    for sentence_match in SENTENCE_PATTERN.finditer(text):
+        sentence = sentence_match.group().strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            segments.append((sentence, sentence_match.end()))
+            continue
+
+        # (clause, offset of its first character, offset past it and the whitespace after it)
+        clauses = []
+        start = sentence_match.start()
+        boundaries = CLAUSE_BOUNDARY.finditer(text, sentence_match.start(), sentence_match.end())
+        for stop, end in [*((m.start(), m.end()) for m in boundaries), (sentence_match.end(),) * 2]:
+            raw = text[start:stop]
+            clauses.append((raw.strip(), start + len(raw) - len(raw.lstrip()), end))
+            start = end
+
+        current, current_end = "", sentence_match.start()
+        for clause, clause_start, clause_end in clauses:
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    segments.append((current, current_end))
+                    current = ""
+                rest = clause[cut:].lstrip()
+                clause_start += len(clause) - len(rest)
+                segments.append((clause[:cut].strip(), clause_start))
+                clause = rest
+            if current and len(current) + len(clause) + 1 > max_chars:
+                segments.append((current, current_end))
+                current = clause
+            else:
+                current = f"{current} {clause}".strip()
+            current_end = clause_end
+        if current:
+            segments.append((current, current_end))
+
+    return [(segment, end) for segment, end in segments if segment]
+
+
+# A sentence is complete once its terminator is followed by whitespace (Latin
+# scripts: "3." may still become "3.5") or immediately (CJK full-width marks)
+SENTENCE_END = re.compile(r"[.!?।]+[\"'”」)]*\s|[。！？]+[\"'”」)]*")
+
+
+class SentenceBuffer:
+    """
+    Incremental split_text for text that arrives in fragments
+
+    feed() returns the segments completed by a fragment; text after the last
+    sentence boundary is held back until more arrives, unless it already
+    exceeds max_chars, in which case all but its last (possibly unfinished)
+    clause is released. flush() returns whatever is left.
+    """
+
+    def __init__(self, max_chars: int = STREAM_SEGMENT_MAX_CHARS):
+        self.max_chars = max_chars
+        self._text = ""
+
+    def feed(self, fragment: str) -> List[str]:
+        self._text += fragment
+        end = 0
+        for match in SENTENCE_END.finditer(self._text):
+            end = match.end()
+        segments = split_text(self._text[:end], self.max_chars) if end else []
+        self._text = self._text[end:]
+
+        if len(self._text) > self.max_chars:
+            pieces = split_text_spans(self._text, self.max_chars)
+            if len(pieces) > 1:
+                segments.extend(segment for segment, _ in pieces[:-1])
+                self._text = self._text[pieces[-2][1]:]
+        return segments
+
+    def flush(self) -> List[str]:
+        segments = split_text(self._text, self.max_chars)
+        self._text = ""
+        return segments
+
+
+def trim_edge_silence(audio_array: np.ndarray, threshold: float = 0.01) -> np.ndarray:
+    """Drop leading and trailing samples quieter than threshold"""
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    loud = np.flatnonzero(np.abs(audio) > threshold)
+    if loud.size == 0:
+        return audio[:0]
+    return audio[loud[0]:loud[-1] + 1]
+
+
+def crossfade_concat(pieces: List[np.ndarray], fade_samples: int) -> np.ndarray:
+    """
+    Concatenate audio pieces, overlapping each join with a linear crossfade
+
+    Each join overlaps min(fade_samples, len(left), len(right)) samples.
+    """
+    pieces = [np.asarray(piece, dtype=np.float32).reshape(-1) for piece in pieces]
+    pieces = [piece for piece in pieces if piece.size]
+    if not pieces:
+        return np.zeros(0, dtype=np.float32)
+
+    fades = [
+        min(fade_samples, len(left), len(right))
+        for left, right in zip(pieces, pieces[1:])
+    ]
+    output = np.zeros(sum(len(piece) for piece in pieces) - sum(fades), dtype=np.float32)
+
+    position = 0
+    for index, piece in enumerate(pieces):
+        piece = piece.copy()
+        fade_in = fades[index - 1] if index > 0 else 0
+        fade_out = fades[index] if index < len(fades) else 0
+        if fade_in:
+            piece[:fade_in] *= np.linspace(0.0, 1.0, fade_in, endpoint=False, dtype=np.float32)
+        if fade_out:
+            piece[-fade_out:] *= np.linspace(1.0, 0.0, fade_out, endpoint=False, dtype=np.float32)
+
+        start = position - fade_in
+        output[start:start + len(piece)] += piece
+        position = start + len(piece)
+
+    return output
+
+
+def stitch_segments(
+    segments: List[np.ndarray],
+    sample_rate: int,
+    crossfade_ms: float = LONG_TEXT_CROSSFADE_MS,
+    pause_ms: float = LONG_TEXT_PAUSE_MS,
+) -> np.ndarray:
+    """
+    Join separately synthesized segments into one utterance
+
+    Each segment's edge silence is trimmed and replaced with a uniform
+    pause, so sentence gaps sound consistent regardless of how much silence
+    the model left on each segment; joins are crossfaded to avoid clicks.
+    """
+    fade_samples = int(sample_rate * crossfade_ms / 1000)
+    pause = np.zeros(int(sample_rate * pause_ms / 1000) + 2 * fade_samples, dtype=np.float32)
+
+    pieces = []
+    for segment in segments:
+        trimmed = trim_edge_silence(segment)
+        if not trimmed.size:
+            continue
+        if pieces and pause.size:
+            pieces.append(pause)
+        pieces.append(trimmed)
+
+    return crossfade_concat(pieces, fade_samples)
+
+
+# Normalization targets (dBFS) when a request gives none
+NORMALIZE_DEFAULT_DB = {NormalizeMode.PEAK: -1.0, NormalizeMode.RMS: -20.0}
+
+
+def postprocess_audio(
+    clips: List[np.ndarray],
+    sample_rate: int,
+    options: PostProcessOptions,
+) -> List[np.ndarray]:
+    """
+    Trim edge silence, normalize loudness and fade a batch of mono clips
+
+    The clips are zero-padded into one (clips x samples) matrix, so every
+    step is a single array operation over the whole batch; each row is cut
+    back to its own kept region at the end. Normalization gain is capped so
+    peaks never exceed full scale. Input arrays are not modified.
+    """
+    clips = [np.asarray(clip, dtype=np.float32).reshape(-1) for clip in clips]
+    lengths = np.array([clip.size for clip in clips], dtype=np.int64)
+    if not clips or lengths.max() == 0:
+        return clips
+
+    width = int(lengths.max())
+    batch = np.zeros((len(clips), width), dtype=np.float32)
+    for row, clip in zip(batch, clips):
+        row[:clip.size] = clip
+    magnitude = np.abs(batch)
+    positions = np.arange(width)
+
+    # Kept region of each clip: [start, end)
+    start = np.zeros(len(clips), dtype=np.int64)
+    end = lengths
+    if options.trim_silence:
+        loud = magnitude > 10 ** (options.silence_threshold_db / 20)
+        any_loud = loud.any(axis=1)
+        start = np.where(any_loud, loud.argmax(axis=1), 0)
+        end = np.where(any_loud, width - loud[:, ::-1].argmax(axis=1), 0)
+    keep = (positions >= start[:, None]) & (positions < end[:, None])
+    envelope = keep.astype(np.float32)
+
+    if options.normalize is not None:
+        target = options.target_db if options.target_db is not None else NORMALIZE_DEFAULT_DB[options.normalize]
+        peak = np.where(keep, magnitude, 0).max(axis=1)
+        if options.normalize == NormalizeMode.PEAK:
+            level = peak
+        else:
+            level = np.sqrt((np.where(keep, batch, 0) ** 2).sum(axis=1) / np.maximum(end - start, 1))
+        gain = np.where(level > 0, 10 ** (target / 20) / np.maximum(level, 1e-12), 1.0)
+        gain = np.minimum(gain, np.where(peak > 0, 1.0 / np.maximum(peak, 1e-12), 1.0))
+        envelope *= gain[:, None].astype(np.float32)
+
+    if options.fade_in_ms > 0:
+        fade = max(1, int(sample_rate * options.fade_in_ms / 1000))
+        envelope *= np.clip((positions - start[:, None]) / fade, 0, 1).astype(np.float32)
+    if options.fade_out_ms > 0:
+        fade = max(1, int(sample_rate * options.fade_out_ms / 1000))
+        envelope *= np.clip((end[:, None] - 1 - positions) / fade, 0, 1).astype(np.float32)
+
+    batch *= envelope
+    return [row[row_start:row_end] for row, row_start, row_end in zip(batch, start, end)]
+
+
+# Frame length (samples) of the spectra compare_audio compares
+COMPARE_FRAME = 1024
+
+
+def compare_audio(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, Any]:
+    """
+    How far candidate audio is from a reference rendering
+
+    Both measures are over the common length. SNR (dB, None when the samples
+    are identical) punishes any phase drift; the log-spectral distance (dB,
+    RMS difference of the frame spectra) only what is audible as a
+    different timbre or pitch.
+    """
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1)
+    candidate = np.asarray(candidate, dtype=np.float64).reshape(-1)
+    length = min(reference.size, candidate.size)
+    error = reference[:length] - candidate[:length]
+    noise = float(np.sum(error ** 2))
+    signal = float(np.sum(reference[:length] ** 2))
+
+    spectral_distance = None
+    if length >= COMPARE_FRAME:
+        window = np.hanning(COMPARE_FRAME)
+
+        def spectrum_db(audio: np.ndarray) -> np.ndarray:
+            frames = np.lib.stride_tricks.sliding_window_view(audio[:length], COMPARE_FRAME)[::COMPARE_FRAME // 4]
+            return 20 * np.log10(np.abs(np.fft.rfft(frames * window, axis=1)) + 1e-6)
+
+        difference = spectrum_db(reference) - spectrum_db(candidate)
+        spectral_distance = round(float(np.mean(np.sqrt(np.mean(difference ** 2, axis=1)))), 2)
+
+    return {
+        "audio_snr_db": round(float(10 * np.log10(signal / noise)), 2) if noise > 0 and signal > 0 else None,
+        "spectral_distance_db": spectral_distance,
+        "audio_max_abs_diff": float(np.abs(error).max()) if length else 0.0,
+        "length_diff_samples": int(candidate.size - reference.size),
+    }
+
+
+def to_pcm16(audio_array: np.ndarray) -> bytes:
+    """Convert float audio in [-1, 1] to little-endian 16-bit PCM bytes"""
+    audio = np.asarray(audio_array, dtype=np.float32)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+# Output format -> (libsndfile format, subtype, media type)
+AUDIO_FORMATS = {
+    AudioFormat.WAV: ("WAV", "PCM_16", "audio/wav"),
+    AudioFormat.FLAC: ("FLAC", "PCM_16", "audio/flac"),
+    AudioFormat.OGG: ("OGG", "OPUS", "audio/ogg"),
+    AudioFormat.MP3: ("MP3", "MPEG_LAYER_III", "audio/mpeg"),
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def available_formats() -> List[AudioFormat]:
+    """Output formats the local libsndfile can encode"""
+    formats = sf.available_formats()
+    return [
+        audio_format for audio_format, (container, _, _) in AUDIO_FORMATS.items()
+        if container in formats
+    ]
+
+
+def resample(audio_array: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """
+    Resample mono audio by linear interpolation
+
+    When downsampling, a windowed-sinc low-pass at the new Nyquist frequency
+    is applied first to avoid aliasing.
+    """
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    if from_rate == to_rate or audio.size == 0:
+        return audio
+
+    if to_rate < from_rate:
+        cutoff = to_rate / from_rate / 2
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        audio = np.convolve(audio, (kernel / kernel.sum()).astype(np.float32), mode="same")
+
+    length = int(round(audio.size * to_rate / from_rate))
+    positions = np.arange(length, dtype=np.float64) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(audio.size), audio).astype(np.float32)
+
+
+def encode_audio(
+    audio_array: np.ndarray,
+    sample_rate: int,
+    audio_format: AudioFormat = AudioFormat.WAV,
+    target_rate: Optional[int] = None,
+) -> tuple[bytes, int]:
+    """
+    Encode audio in memory, resampling first if needed
+
+    Returns:
+        (encoded_bytes, output_sample_rate)
+    """
+    import io
+    container, subtype, _ = AUDIO_FORMATS[audio_format]
+    if container == "OGG" and "OPUS" not in sf.available_subtypes("OGG"):
+        subtype = "VORBIS"
+
+    output_rate = target_rate or sample_rate
+    if subtype == "OPUS" and output_rate not in OPUS_SAMPLE_RATES:
+        # Opus only runs at a few fixed rates; use the nearest one at or above the target
+        output_rate = min((rate for rate in OPUS_SAMPLE_RATES if rate >= output_rate), default=48000)
+
+    audio = resample(audio_array, sample_rate, output_rate)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, output_rate, format=container, subtype=subtype)
+    return buffer.getvalue(), output_rate
+
+
+def prepare_reference_audio(source_path: str, dest_path: str, target_rate: int) -> float:
+    """
+    Decode an uploaded reference recording to mono 16-bit WAV at target_rate
+
+    Runs in an encoder worker so a long upload is never decoded in the
+    service process. Returns the duration in seconds.
+    """
+    try:
+        audio, sample_rate = sf.read(source_path, dtype="float32", always_2d=True)
+    except Exception:
+        # libsndfile errors don't survive the trip back from a worker process
+        raise ValueError("Unreadable reference audio (unsupported or corrupt file)")
+
+    mono = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    del audio
+    mono = resample(mono, sample_rate, target_rate)
+    sf.write(dest_path, mono, target_rate, format="WAV", subtype="PCM_16")
+    return mono.size / target_rate
+
+
+class AudioEncoder:
+    """
+    Runs encode_audio in a process pool so compression and resampling
+    don't compete with generation threads for the GIL
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.restarts = 0
+
+    def start(self):
+        """
+        Start worker processes
+
+        Workers come from a forkserver (spawn where that's unavailable), not
+        a fork of this process: forking a process that already runs threads
+        can leave locks held forever in the child. The forkserver imports
+        this module once; workers are forked from it.
+        """
+        if self.workers <= 0 or self._pool is not None:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if context.get_start_method() == "forkserver":
+            context.set_forkserver_preload(["__main__", __name__])
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        # Submit one no-op per worker so processes are ready before the first request
+        for _ in range(self.workers):
+            self._pool.submit(int)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replace a pool whose worker died (once, however many calls saw it break)"""
+        if self._pool is not broken:
+            return
+        logger.warning("Encoder worker died - restarting the encoder pool")
+        self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self.start()
+
+    async def _run(self, fn, *args) -> Any:
+        """Run fn in the pool (the default thread pool when disabled), retrying once on a fresh pool if it broke"""
+        loop = asyncio.get_event_loop()
+        for attempt in range(2):
+            pool = self._pool  # None -> default thread pool
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                self._restart(pool)
+                if attempt:
+                    raise
+
+    async def encode(
+        self,
+        audio_array: np.ndarray,
+        sample_rate: int,
+        audio_format: AudioFormat = AudioFormat.WAV,
+        target_rate: Optional[int] = None,
+    ) -> tuple[bytes, int]:
+        return await self._run(encode_audio, audio_array, sample_rate, audio_format, target_rate)
+
+    async def prepare_reference(self, source_path: str, dest_path: str) -> float:
+        return await self._run(prepare_reference_audio, source_path, dest_path, CLONE_REFERENCE_SAMPLE_RATE)
+
+
+# Global output encoder (process pool)
+audio_encoder = AudioEncoder(workers=ENCODE_WORKERS)
+
+
+def wants_binary_audio(accept: Optional[str]) -> bool:
+    """
+    Content negotiation for synthesis responses
+
+    Returns True when the Accept header prefers audio (any audio/ type)
+    over JSON. A missing or wildcard-only Accept header keeps the JSON mode.
+    """
+    if not accept:
+        return False
+
+    best_audio = best_json = 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        media_type = media_type.strip().lower()
+        if media_type.startswith("audio/"):
+            best_audio = max(best_audio, quality)
+        elif media_type == "application/json":
+            best_json = max(best_json, quality)
+
+    return best_audio > 0 and best_audio >= best_json
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """
+    WAV header for a stream of unknown length
+
+    RIFF and data chunk sizes are set to 0xFFFFFFFF, which players treat
+    as "read until end of stream".
+    """
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack(
+            "<IHHIIHH",
+            16,
+            1,  # PCM
+            channels,
+            sample_rate,
+            sample_rate * block_align,
+            block_align,
+            bits_per_sample,
+        )
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+# ============================================================================
+# Warmup
+# ============================================================================
+
+class Warmup:
+    """
+    Load and exercise models before the service takes traffic
+
+    Each listed model is loaded into the residency and runs one short
+    generation (synthesis for CustomVoice models, a design for the
+    VoiceDesign model, a clone of a synthetic reference for Base models),
+    so the first real request pays neither load nor first-inference
+    costs. Progress is exposed for /ready and /health.
+    """
+
+    def __init__(self, model_names: List[str]):
+        self.models = []
+        for name in model_names:
+            try:
+                model = QwenModel(name)
+            except ValueError:
+                logger.warning(f"Ignoring unknown warmup model: {name}")
+                continue
+            if model == QwenModel.AUTO:
+                self.models += [ModelRouter.LARGE, ModelRouter.SMALL]
+            else:
+                self.models.append(model)
+
+        self.status = "pending" if self.models else "ready"
+        self.current: Optional[str] = None
+        self.completed: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Run warmup in the background so /health answers while models load"""
+        self._task = asyncio.ensure_future(self.run())
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def run(self):
+        if not self.models:
+            return
+        if not BACKEND_AVAILABLE:
+            self.status = "ready"
+            logger.warning(f"TTS backend '{TTS_BACKEND}' not available - skipping warmup")
+            return
+
+        total_mb = sum(
+            MODEL_MEMORY_ESTIMATE_MB.get(model.value, DEFAULT_MODEL_MEMORY_MB)
+            for model in self.models
+        )
+        if total_mb > MODEL_MEMORY_BUDGET_MB:
+            logger.warning(
+                f"Warmup models need ~{total_mb} MB but MODEL_MEMORY_BUDGET_MB is "
+                f"{MODEL_MEMORY_BUDGET_MB} - earlier ones will be evicted again"
+            )
+
+        self.status = "warming"
+        self.started_at = time.time()
+
+        for index, model in enumerate(self.models, start=1):
+            self.current = model.value
+            logger.info(f"Warmup {index}/{len(self.models)}: {model.value}")
+            start_time = time.time()
+            try:
+                await self._exercise(model)
+            except Exception as e:
+                self.status = "failed"
+                self.error = f"{model.value}: {e}"
+                self.current = None
+                logger.error(f"Warmup failed for {model.value}: {e}", exc_info=True)
+                return
+            self.completed[model.value] = round(time.time() - start_time, 3)
+            logger.info(f"Warmup {index}/{len(self.models)}: {model.value} ready in {self.completed[model.value]:.2f}s")
+
+        self.current = None
+        self.status = "ready"
+        self.finished_at = time.time()
+        logger.info(f"Warmup complete in {self.finished_at - self.started_at:.2f}s")
+
+    async def _exercise(self, model: QwenModel):
+        if model.value.endswith("CustomVoice"):
+            await engine.synthesize(
+                text=WARMUP_TEXT,
+                model=model,
+                max_tokens=WARMUP_MAX_TOKENS,
+                priority=Priority.BULK,
+            )
+        elif model.value.endswith("VoiceDesign"):
+            await engine.design_voice(description="A clear, neutral voice", model=model)
+        else:
+            # Base models back voice cloning: clone one second of faint noise
+            import tempfile
+            with tempfile.TemporaryDirectory(prefix="qwentts-warmup-") as temp_dir:
+                reference_path = str(Path(temp_dir) / "reference.wav")
+                noise = np.random.default_rng(0).normal(0, 0.01, CLONE_REFERENCE_SAMPLE_RATE)
+                sf.write(reference_path, noise.astype(np.float32), CLONE_REFERENCE_SAMPLE_RATE)
+                await engine.clone_voice(audio_path=reference_path, transcript=WARMUP_TEXT, model=model)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "progress": f"{len(self.completed)}/{len(self.models)}",
+            "current": self.current,
+            "completed": self.completed,
+            "error": self.error,
+        }
+
+
+# Global warmup state
+warmup = Warmup(WARMUP_MODELS)
+
+
+# ============================================================================
+# Async Jobs
+# ============================================================================
+
+class JobManager:
+    """
+    Run long operations as background jobs with on-disk status
+
+    submit() stores the job and returns at once; a fixed set of worker
+    coroutines runs queued jobs, and each job's status and result are
+    written to JOBS_PATH/<job_id>/job.json (artifacts live alongside).
+    Finished jobs are deleted once their TTL passes. Jobs that were queued
+    or running when the process stopped are marked failed on restart. Job
+    work waits for room in full worker pools rather than failing.
+    """
+
+    def __init__(self, path: Path, workers: int, max_queue: int, ttl_seconds: int):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+
+        self._jobs: Dict[str, JobInfo] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.path / job_id
+
+    async def start(self):
+        """Load persisted jobs and start the workers and the expiry sweep"""
+        loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue()
+
+        for job in await loop.run_in_executor(None, self._load_all):
+            if job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+                self._finish(job, error="Interrupted by service restart")
+                await self._persist(job)
+            self._jobs[job.job_id] = job
+            self._done[job.job_id] = asyncio.Event()
+            self._done[job.job_id].set()
+
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._expire_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def _load_all(self) -> List[JobInfo]:
+        jobs = []
+        for job_path in self.path.glob("*/job.json"):
+            try:
+                jobs.append(JobInfo(**json.loads(job_path.read_text())))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job {job_path}: {e}")
+        return jobs
+
+    def check_capacity(self):
+        """Raise 503 if the job queue is full (also checked by submit)"""
+        pending = sum(
+            1 for job in self._jobs.values()
+            if job.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+        )
+        if pending >= self.max_queue:
+            raise HTTPException(
+                status_code=503,
+                detail="Job queue is full, retry later",
+                headers={"Retry-After": "30"},
+            )
+
+    async def submit(self, kind: str, runner, job_id: Optional[str] = None) -> JobInfo:
+        """
+        Queue a job; runner(job_dir) is a coroutine function returning the
+        result dict (and may write artifacts into job_dir)
+        """
+        self.check_capacity()
+
+        job = JobInfo(
+            job_id=job_id or uuid.uuid4().hex,
+            kind=kind,
+            created_at=datetime.utcnow().isoformat(),
+        )
+        self.job_dir(job.job_id).mkdir(parents=True, exist_ok=True)
+        await self._persist(job)
+
+        self._jobs[job.job_id] = job
+        self._done[job.job_id] = asyncio.Event()
+        self._queue.put_nowait((job, runner))
+        logger.info(f"Queued {kind} job {job.job_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[JobInfo]:
+        """Long-poll: wait up to timeout seconds for the job to finish"""
+        done = self._done.get(job_id)
+        if done is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(job_id)
+
+    async def _worker(self):
+        # Background work queues behind a full worker pool instead of failing with 503
+        queue_when_full.set(True)
+        while True:
+            job, runner = await self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = datetime.utcnow().isoformat()
+            await self._persist(job)
+
+            try:
+                result = await runner(self.job_dir(job.job_id))
+                self._finish(job, result=result)
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                self._finish(job, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"Job {job.job_id} ({job.kind}) failed: {e}", exc_info=True)
+                self._finish(job, error=str(e))
+
+            await self._persist(job)
+            self._done[job.job_id].set()
+            logger.info(f"Job {job.job_id} ({job.kind}) {job.status.value}")
+
+    def _finish(self, job: JobInfo, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        now = datetime.utcnow()
+        job.status = JobStatus.FAILED if error else JobStatus.SUCCEEDED
+        job.result = result
+        job.error = error
+        job.finished_at = now.isoformat()
+        job.expires_at = (now + timedelta(seconds=self.ttl_seconds)).isoformat()
+
+    async def _persist(self, job: JobInfo):
+        job_path = self.job_dir(job.job_id) / "job.json"
+        temp_path = job_path.with_suffix(".tmp")
+        async with aiofiles.open(temp_path, "w") as f:
+            await f.write(job.model_dump_json(indent=2))
+        os.replace(temp_path, job_path)
+
+    async def _expire_loop(self):
+        import shutil
+        loop = asyncio.get_event_loop()
+        while True:
+            now = datetime.utcnow().isoformat()
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.expires_at and job.expires_at <= now
+            ]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+                self._done.pop(job_id, None)
+                await loop.run_in_executor(
+                    None, functools.partial(shutil.rmtree, self.job_dir(job_id), ignore_errors=True)
+                )
+            if expired:
+                logger.info(f"Expired {len(expired)} jobs")
+            await asyncio.sleep(60)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {status.value: 0 for status in JobStatus}
+        for job in self._jobs.values():
+            counts[job.status.value] += 1
+        return counts
+
+
+# Global job manager
+jobs = JobManager(
+    path=JOBS_PATH,
+    workers=JOB_WORKERS,
+    max_queue=JOB_MAX_QUEUE,
+    ttl_seconds=JOB_TTL_SECONDS,
+)
+
+
+# ============================================================================
+# API Endpoints
+# ============================================================================
+
+@app.get("/")
+async def root():
+    return {
+        "service": "QwenTTS Bridge",
+        "version": "1.0.0",
+        "status": "operational",
+        "comfyui_available": COMFYUI_AVAILABLE,
+        "backend": TTS_BACKEND,
+        "formats": [audio_format.value for audio_format in available_formats()],
+    }
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "comfyui": COMFYUI_AVAILABLE,
+        "backend": TTS_BACKEND,
+        "warmup": warmup.stats(),
+        "voice_library": str(VOICE_LIBRARY_PATH),
+        "voices_count": VoiceLibrary.catalog.count(),
+        "cache": synthesis_cache.stats(),
+        "models": engine.residency.stats(),
+        "voice_cache": VoiceLibrary.embedding_cache.stats(),
+        "voice_embeddings": VoiceLibrary.embeddings.stats(),
+        "pools": {name: pool.stats() for name, pool in engine.pools.items()},
+        "single_flight": engine.single_flight.stats(),
+        "auto_model": engine.router.stats(),
+        "jobs": jobs.stats(),
+    }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once warmup has finished, 503 before (or if it failed)
+
+    Unlike /health (liveness), load balancers should only route to
+    replicas that pass this check.
+    """
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"ready": False, **warmup.stats()})
+    return {"ready": True, **warmup.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    for pool in engine.pools.values():
+        pool.update_gauges()
+    ACTIVE_VOICES.set(VoiceLibrary.catalog.count())
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@dataclass
+class RenderedSpeech:
+    audio_bytes: bytes
+    sample_rate: int
+    duration_ms: int
+    cache: str  # X-Cache value: HIT-MEMORY, HIT-DISK, MISS or BYPASS
+
+
+async def render_speech(request: SynthesizeRequest, endpoint: str = "synthesize") -> RenderedSpeech:
+    """
+    Produce encoded audio for one request: result cache, then synthesis
+    (long-text mode for long inputs), then post-processing and encoding
+    """
+    start_time = time.time()
+    request = engine.router.resolve(request)
+
+    if request.format not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format {request.format.value} not available; "
+                   f"use one of {[f.value for f in available_formats()]}",
+        )
+
+    long_text = (
+        request.long_text if request.long_text is not None
+        else len(request.text) > LONG_TEXT_THRESHOLD_CHARS
+    )
+
+    cache_key = None
+    cached = None
+    if synthesis_cache.enabled and SynthesisCache.cacheable(request):
+        cache_key = (
+            await SynthesisCache.key_for(request, long_text=True) if long_text
+            else await SynthesisCache.key_for(request)
+        )
+        with timed_stage("cache"):
+            cached, tier = await synthesis_cache.get(cache_key)
+        cache_status = "MISS" if cached is None else f"HIT-{tier.upper()}"
+    else:
+        synthesis_cache.bypassed += 1
+        cache_status = "BYPASS"
+    CACHE_LOOKUPS.labels(cache_status.lower().replace("-", "_")).inc()
+
+    if cached is not None:
+        audio_bytes = cached.audio_bytes
+        sample_rate = cached.sample_rate
+        duration_ms = cached.duration_ms
+    else:
+        # Synthesize
+        compute_start = time.time()
+        if long_text:
+            audio_array, sample_rate = await synthesize_long_text(request)
+        else:
+            audio_array, sample_rate = await engine.synthesize(
+                text=request.text,
+                language=request.language,
+                voice=request.voice,
+                instruction=request.instruction,
+                model=request.model,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                do_sample=request.do_sample,
+                seed=request.seed,
+                priority=request.priority,
+            )
+
+        # Calculate duration
+        duration_ms = int((len(audio_array) / sample_rate) * 1000)
+        compute_seconds = time.time() - compute_start
+        if compute_seconds > 0:
+            REALTIME_FACTOR.labels(
+                request.model.value, language_label(request.language)
+            ).observe(duration_ms / 1000 / compute_seconds)
+
+        if request.postprocess is not None:
+            with timed_stage("postprocess"):
+                loop = asyncio.get_event_loop()
+                processed = await loop.run_in_executor(
+                    None, postprocess_audio, [audio_array], sample_rate, request.postprocess
+                )
+            audio_array = processed[0]
+            duration_ms = int((len(audio_array) / sample_rate) * 1000)
+
+        # Encode (and resample) off the event loop
+        with timed_stage("encode"):
+            audio_bytes, sample_rate = await audio_encoder.encode(
+                audio_array, sample_rate, request.format, request.sample_rate
+            )
+
+        if cache_key is not None:
+            with timed_stage("cache"):
+                synthesis_cache.put(cache_key, CachedAudio(
+                    audio_bytes=audio_bytes,
+                    sample_rate=sample_rate,
+                    duration_ms=duration_ms,
+                ))
+
+    latency = time.time() - start_time
+    logger.info(
+        f"Synthesized: '{request.text[:50]}...' "
+        f"({request.language}, {request.voice or 'default'}) "
+        f"→ {len(audio_bytes)} bytes in {latency:.2f}s "
+        f"[cache {cache_status.lower()}]"
+    )
+    OUTPUT_BYTES.labels(
+        endpoint, request.model.value, language_label(request.language)
+    ).inc(len(audio_bytes))
+
+    return RenderedSpeech(
+        audio_bytes=audio_bytes,
+        sample_rate=sample_rate,
+        duration_ms=duration_ms,
+        cache=cache_status,
+    )
+
+
+@app.post("/api/v1/synthesize", response_model=SynthesizeResponse)
+async def synthesize_speech(
+    request: SynthesizeRequest,
+    response: Response,
+    accept: Optional[str] = Header(None),
+):
+    """
+    Synthesize speech from text
+
+    "format" selects wav, flac, ogg (Opus) or mp3, and "sample_rate" resamples
+    the output. Send "Accept: audio/*" to receive the raw audio bytes instead
+    of base64 JSON; duration, sample rate, model and voice are then returned
+    in X-Duration-Ms, X-Sample-Rate, X-Model and X-Voice-Id headers.
+
+    Deterministic requests (do_sample=false, or a fixed seed) are served from
+    the result cache when possible; set "use_cache": false to bypass it.
+    The X-Cache response header reports memory/disk hit, miss or bypass.
+
+    Long texts (see "long_text") are synthesized sentence by sentence and
+    stitched; on the ComfyUI backend the sentences run one after another,
+    so this takes as long as the whole text would.
+
+    The Server-Timing header breaks the request down by stage (ms): cache,
+    embedding, queue, node, generate, encode, base64 and total; stages that
+    did not run are omitted.
+
+    Example:
+        {
+          "text": "Hello, how are you today?",
+          "language": "en",
+          "voice": "custom_1",
+          "instruction": "speak in a warm, friendly tone",
+          "model": "Qwen3-TTS-12Hz-1.7B-CustomVoice"
+        }
+    """
+    # Resolve "auto" here so headers, response and metrics name the actual model
+    request = engine.router.resolve(request)
+
+    if request.streaming:
+        return await stream_speech(request)
+
+    start_time = time.time()
+    status = "200"
+    timings = StageTimings()
+    current_timings.set(timings)
+
+    try:
+        rendered = await render_speech(request)
+
+        if wants_binary_audio(accept):
+            timings.add("total", time.time() - start_time)
+            headers = {
+                "X-Duration-Ms": str(rendered.duration_ms),
+                "X-Sample-Rate": str(rendered.sample_rate),
+                "X-Model": request.model.value,
+                "X-Cache": rendered.cache,
+                "Server-Timing": timings.server_timing(),
+            }
+            if request.voice:
+                headers["X-Voice-Id"] = request.voice
+            return Response(
+                content=rendered.audio_bytes,
+                media_type=AUDIO_FORMATS[request.format][2],
+                headers=headers,
+            )
+
+        with timed_stage("base64"):
+            audio = base64.b64encode(rendered.audio_bytes).decode()
+        timings.add("total", time.time() - start_time)
+        response.headers["X-Cache"] = rendered.cache
+        response.headers["Server-Timing"] = timings.server_timing()
+        return SynthesizeResponse(
+            audio=audio,
+            format=request.format.value,
+            sample_rate=rendered.sample_rate,
+            duration_ms=rendered.duration_ms,
+            voice_id=request.voice,
+            model=request.model.value,
+        )
+
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except Exception as e:
+        status = "500"
+        logger.error(f"Synthesis error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        record_request(
+            "synthesize", request.model.value, request.language, status, time.time() - start_time
+        )
+        timings.stages.setdefault("total", (time.time() - start_time) * 1000)
+        trace_timings("synthesize", request, status, timings)
+
+
+@app.post("/api/v1/synthesize/batch")
+async def synthesize_batch(batch: BatchSynthesizeRequest):
+    """
+    Synthesize many texts in one call
+
+    Items are scheduled through the engine together (up to BATCH_ENDPOINT_CONCURRENCY
+    in flight, so the synthesis pool stays busy) and results are
+    streamed back as NDJSON, one line per item in completion order:
+
+        {"index": 3, "status": "ok", "audio": "<base64>", "format": "wav", ...}
+        {"index": 7, "status": "error", "status_code": 404, "error": "Voice ... not found"}
+
+    A failing item does not fail the batch. Items default to the bulk lane
+    and wait for room when the synthesis queue is full instead of failing.
+    """
+    semaphore = asyncio.Semaphore(max(1, BATCH_ENDPOINT_CONCURRENCY))
+
+    async def run_item(index: int, item: SynthesizeRequest) -> Dict[str, Any]:
+        queue_when_full.set(True)
+        item = item.model_copy(update={
+            "streaming": False,
+            "priority": item.priority or Priority.BULK,
+        })
+        start_time = time.time()
+        status = "200"
+        try:
+            async with semaphore:
+                # Route "auto" when the item actually starts, not when the batch arrived
+                item = engine.router.resolve(item)
+                rendered = await render_speech(item, endpoint="synthesize_batch")
+            return {
+                "index": index,
+                "status": "ok",
+                "audio": base64.b64encode(rendered.audio_bytes).decode(),
+                "format": item.format.value,
+                "sample_rate": rendered.sample_rate,
+                "duration_ms": rendered.duration_ms,
+                "voice_id": item.voice,
+                "model": item.model.value,
+                "cache": rendered.cache,
+            }
+        except HTTPException as e:
+            status = str(e.status_code)
+            return {"index": index, "status": "error", "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            status = "500"
+            logger.error(f"Batch item {index} error: {e}", exc_info=True)
+            return {"index": index, "status": "error", "status_code": 500, "error": str(e)}
+        finally:
+            record_request(
+                "synthesize_batch", item.model.value, item.language, status, time.time() - start_time
+            )
+
+    async def records():
+        tasks = [
+            asyncio.ensure_future(run_item(index, item))
+            for index, item in enumerate(batch.items)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                record = await next_done
+                yield json.dumps(record) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    logger.info(f"Batch synthesis: {len(batch.items)} items")
+    return StreamingResponse(records(), media_type="application/x-ndjson")
+
+
+async def synthesize_long_text(request: SynthesizeRequest) -> tuple[np.ndarray, int]:
+    """
+    Synthesize a long text as sentence segments stitched together
+
+    Segments are submitted together but only generate in parallel on
+    thread-safe nodes (up to NODE_CONCURRENCY at once, e.g. the stand-in
+    with STANDIN_THREAD_SAFE).
+    On the ComfyUI backend every segment goes through the one warm node
+    and its lock, one after another, so latency still grows linearly with
+    the text; this mode gives per-sentence token budgets and even pauses,
+    not a speedup.
+    """
+    segments = split_text(request.text, segment_max_chars(request.language)) or [request.text]
+
+    results = await asyncio.gather(*[
+        engine.synthesize(
+            text=segment,
+            language=request.language,
+            voice=request.voice,
+            instruction=request.instruction,
+            model=request.model,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            do_sample=request.do_sample,
+            seed=request.seed,
+            priority=request.priority or Priority.BULK,
+        )
+        for segment in segments
+    ])
+
+    sample_rate = results[0][1]
+    with timed_stage("stitch"):
+        audio_array = stitch_segments([audio for audio, _ in results], sample_rate)
+    logger.info(f"Long text: {len(request.text)} chars in {len(segments)} segments")
+    return audio_array, sample_rate
+
+
+async def stream_speech(request: SynthesizeRequest) -> StreamingResponse:
+    """
+    Stream synthesized speech sentence by sentence
+
+    The text is split at sentence/clause boundaries and each segment is
+    synthesized in order, with the next segment generating while the current
+    one is sent. The response is a WAV stream with an open-ended header
+    followed by 16-bit PCM chunks at the model's sample rate (format and
+    sample_rate are not applied to streams).
+    """
+    start_time = time.time()
+    request = engine.router.resolve(request)
+    segments = split_text(request.text, segment_max_chars(request.language)) or [request.text]
+
+    def synthesize_segment(text: str) -> asyncio.Task:
+        return asyncio.ensure_future(engine.synthesize(
+            text=text,
+            language=request.language,
+            voice=request.voice,
+            instruction=request.instruction,
+            model=request.model,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            do_sample=request.do_sample,
+            seed=request.seed,
+            priority=request.priority,
+        ))
+
+    # Wait for the first segment up front so failures still return a proper error
+    first = synthesize_segment(segments[0])
+    try:
+        first_audio, sample_rate = await first
+    except HTTPException as e:
+        record_request(
+            "synthesize_stream", request.model.value, request.language,
+            str(e.status_code), time.time() - start_time,
+        )
+        raise
+    except Exception as e:
+        logger.error(f"Streaming synthesis error: {e}", exc_info=True)
+        record_request(
+            "synthesize_stream", request.model.value, request.language,
+            "500", time.time() - start_time,
+        )
+        raise HTTPException(status_code=500, detail=str(e))
+
+    first_latency = time.time() - start_time
+
+    output_bytes = OUTPUT_BYTES.labels(
+        "synthesize_stream", request.model.value, language_label(request.language)
+    )
+
+    async def audio_chunks():
+        status = "200"
+        header = wav_stream_header(sample_rate)
+        chunk = to_pcm16(first_audio)
+        output_bytes.inc(len(header) + len(chunk))
+        yield header
+        yield chunk
+
+        pending = synthesize_segment(segments[1]) if len(segments) > 1 else None
+        try:
+            for index in range(1, len(segments)):
+                audio_array, _ = await pending
+                pending = (
+                    synthesize_segment(segments[index + 1])
+                    if index + 1 < len(segments) else None
+                )
+                chunk = to_pcm16(audio_array)
+                output_bytes.inc(len(chunk))
+                yield chunk
+        except Exception as e:
+            status = "500"
+            logger.error(f"Streaming synthesis error: {e}", exc_info=True)
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+            record_request(
+                "synthesize_stream", request.model.value, request.language,
+                status, time.time() - start_time,
+            )
 
-        # Prepare inputs based on model type
-        inputs = {
-            "text": text,
-            "model_name": model.value,
-            "max_new_tokens": max_tokens,
-            "temperature": temperature,
-            "do_sample": do_sample,
-        }
+        logger.info(
+            f"Streamed: '{request.text[:50]}...' "
+            f"({request.language}, {request.voice or 'default'}) "
+            f"{len(segments)} segments, first audio in {first_latency:.2f}s, "
+            f"total {time.time() - start_time:.2f}s"
+        )
 
-        if instruction:
-            inputs["instruction"] = instruction
+    return StreamingResponse(
+        audio_chunks(),
+        media_type="audio/wav",
+        headers={
+            "X-Sample-Rate": str(sample_rate),
+            "X-Segments": str(len(segments)),
+        },
+    )
 
-        if voice and not voice.startswith("voice_"):
-            # Custom voice (1-9)
-            inputs["speaker"] = voice
 
-        # Run synthesis
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, node.generate, **inputs)
+@app.websocket("/api/v1/synthesize/ws")
+async def synthesize_websocket(websocket: WebSocket):
+    """
+    Incremental synthesis: text in as it is produced, audio out per sentence
 
-        # Extract audio
-        audio_array = result.get("audio")
-        sample_rate = result.get("sample_rate", 24000)
+    For text generated token by token (e.g. an LLM reply). Each sentence is
+    submitted for synthesis as soon as its boundary arrives (at most
+    WS_SEGMENTS_AHEAD ahead of the one being sent) and audio is sent back in
+    order, so the first audio follows the first sentence rather than the
+    whole text. Client messages (JSON text frames):
 
-        return audio_array, sample_rate
+        {"type": "start", "language": "en", "voice": "custom_1", ...}
+            optional, first: any SynthesizeRequest field except text
+        {"type": "text", "text": "Hello, how are"}   append a fragment
+        {"type": "flush"}                            synthesize what is buffered
+        {"type": "end"}                              flush, finish and close
 
-    async def clone_voice(
-        self,
-        audio_path: str,
-        transcript: str,
-        language: str = "en"
-    ) -> np.ndarray:
-        """
-        Clone voice from audio sample
+    Server messages: {"type": "audio", "index", "text", "sample_rate",
+    "duration_ms", "model"} each followed by one binary frame of 16-bit mono
+    PCM; {"type": "error", "index", "status_code", "error"} for a failed
+    segment or bad message; {"type": "done", "segments", "duration_ms"} last.
+    """
+    await websocket.accept()
+    start_time = time.time()
+    request = SynthesizeRequest(text="", priority=Priority.INTERACTIVE)
+    sentences: Optional[SentenceBuffer] = None
+    queue: asyncio.Queue = asyncio.Queue()
+    submitted: List[asyncio.Task] = []
+    text_start = start_time
+    first_audio: Optional[float] = None
+    audio_ms = 0
+    # Released by the sender once a sentence's audio is out
+    ahead = asyncio.Semaphore(max(1, WS_SEGMENTS_AHEAD))
 
-        Returns:
-            Voice embedding
-        """
-        if not COMFYUI_AVAILABLE:
-            raise RuntimeError("ComfyUI not available")
+    async def synthesize_sentence(text: str):
+        await ahead.acquire()
+        return await engine.synthesize(
+            text=text,
+            language=request.language,
+            voice=request.voice,
+            instruction=request.instruction,
+            model=request.model,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            do_sample=request.do_sample,
+            seed=request.seed,
+            priority=request.priority,
+        )
 
-        node_class = QWEN_NODES['VoiceClone']
-        node = node_class()
+    def submit(text: str):
+        submitted.append(asyncio.ensure_future(synthesize_sentence(text)))
+        queue.put_nowait((len(submitted) - 1, text, submitted[-1]))
 
-        # Create voice embedding
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            node.create_voice,
-            audio_path,
-            transcript,
-            language
+    async def send_audio():
+        nonlocal first_audio, audio_ms
+        output_bytes = OUTPUT_BYTES.labels(
+            "synthesize_ws", request.model.value, language_label(request.language)
         )
+        while (item := await queue.get()) is not None:
+            index, text, task = item
+            try:
+                audio_array, sample_rate = await task
+            except HTTPException as e:
+                ahead.release()
+                await websocket.send_json({
+                    "type": "error", "index": index, "status_code": e.status_code, "error": e.detail,
+                })
+                continue
+            except Exception as e:
+                ahead.release()
+                logger.error(f"WebSocket synthesis error: {e}", exc_info=True)
+                await websocket.send_json({
+                    "type": "error", "index": index, "status_code": 500, "error": str(e),
+                })
+                continue
 
-        embedding = result.get("embedding")
-        return embedding
+            chunk = to_pcm16(audio_array)
+            duration_ms = int(len(audio_array) / sample_rate * 1000)
+            await websocket.send_json({
+                "type": "audio",
+                "index": index,
+                "text": text,
+                "sample_rate": sample_rate,
+                "duration_ms": duration_ms,
+                "model": request.model.value,
+            })
+            await websocket.send_bytes(chunk)
+            ahead.release()
+            output_bytes.inc(len(chunk))
+            audio_ms += duration_ms
+            if first_audio is None:
+                first_audio = time.time() - text_start
 
-    async def design_voice(
-        self,
-        description: str,
-        language: str = "en"
-    ) -> np.ndarray:
-        """
-        Design voice from natural language description
+    sender: Optional[asyncio.Task] = None
+    status = "200"
+    try:
+        while True:
+            try:
+                # A binary frame has no "text" (KeyError, or TypeError for text=None)
+                message = await websocket.receive_json()
+                kind = message.get("type")
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                await websocket.send_json({"type": "error", "status_code": 400, "error": "Expected a JSON object"})
+                continue
 
-        Returns:
-            Voice embedding
-        """
-        if not COMFYUI_AVAILABLE:
-            raise RuntimeError("ComfyUI not available")
+            if kind == "start" and sentences is None:
+                try:
+                    options = {k: v for k, v in message.items() if k not in ("type", "text", "streaming")}
+                    request = SynthesizeRequest(text="", **{"priority": Priority.INTERACTIVE, **options})
+                except ValidationError as e:
+                    await websocket.send_json({"type": "error", "status_code": 422, "error": str(e)})
+                    status = "422"
+                    await websocket.close(code=1008)
+                    return
+                continue
 
-        node_class = QWEN_NODES['VoiceDesign']
-        node = node_class()
+            if sentences is None:
+                # Pick the model once, so the whole reply keeps one voice
+                request = engine.router.resolve(request)
+                sentences = SentenceBuffer(segment_max_chars(request.language))
+                text_start = time.time()
+                sender = asyncio.ensure_future(send_audio())
 
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            node.design_voice,
-            description,
-            language
-        )
+            if kind == "text":
+                for text in sentences.feed(str(message.get("text", ""))):
+                    submit(text)
+            elif kind == "flush":
+                for text in sentences.flush():
+                    submit(text)
+            elif kind == "end":
+                for text in sentences.flush():
+                    submit(text)
+                break
+            else:
+                await websocket.send_json({
+                    "type": "error", "status_code": 400, "error": f"Unexpected message type: {kind}",
+                })
 
-        embedding = result.get("embedding")
-        return embedding
+        queue.put_nowait(None)
+        await sender
+        await websocket.send_json({"type": "done", "segments": len(submitted), "duration_ms": audio_ms})
+        await websocket.close()
 
+    except WebSocketDisconnect:
+        status = "499"
+    except Exception as e:
+        status = "500"
+        logger.error(f"WebSocket synthesis error: {e}", exc_info=True)
+    finally:
+        for task in [*submitted, sender]:
+            if task is not None and not task.done():
+                task.cancel()
+        record_request("synthesize_ws", request.model.value, request.language, status, time.time() - start_time)
 
-# Global engine instance
-engine = QwenTTSEngine()
+    logger.info(
+        f"WebSocket synthesis: {len(submitted)} segments "
+        f"({request.language}, {request.voice or 'default'}, {request.model.value}), "
+        f"first audio {first_audio or 0:.2f}s after the first text, total {time.time() - start_time:.2f}s"
+    )
 
 
-# ============================================================================
-# API Endpoints
-# ============================================================================
+async def save_upload(upload: UploadFile, dest_path: Path) -> str:
+    """Stream an upload to disk in chunks; returns the SHA-256 of its content"""
+    digest = hashlib.sha256()
+    async with aiofiles.open(dest_path, "wb") as f:
+        while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+            digest.update(chunk)
+            await f.write(chunk)
+    return digest.hexdigest()
 
-@app.get("/")
-async def root():
-    return {
-        "service": "QwenTTS Bridge",
-        "version": "1.0.0",
-        "status": "operational",
-        "comfyui_available": COMFYUI_AVAILABLE,
-    }
 
+def clone_source_hash(audio_sha256: str, transcript: str, language: str) -> str:
+    """Identity of a clone's inputs: the same recording and transcript give the same voice"""
+    canonical = json.dumps(
+        {"audio": audio_sha256, "transcript": transcript, "language": language},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "comfyui": COMFYUI_AVAILABLE,
-        "voice_library": str(VOICE_LIBRARY_PATH),
-        "voices_count": len(list(VOICE_LIBRARY_PATH.iterdir())),
-    }
 
+# Concurrent uploads of the same recording share one clone
+clone_flight = SingleFlight()
 
-@app.post("/api/v1/synthesize", response_model=SynthesizeResponse)
-async def synthesize_speech(request: SynthesizeRequest):
+
+async def clone_voice_from_file(
+    audio_path: str,
+    filename: Optional[str],
+    transcript: str,
+    name: str,
+    language: str = "en",
+    save_to_library: bool = True,
+    audio_sha256: Optional[str] = None,
+    release_upload=None,
+) -> VoiceInfo:
     """
-    Synthesize speech from text
+    Clone a voice from an audio file on disk and optionally save it
 
-    Example:
-        {
-          "text": "Hello, how are you today?",
-          "language": "en",
-          "voice": "custom_1",
-          "instruction": "speak in a warm, friendly tone",
-          "model": "Qwen3-TTS-12Hz-1.7B-CustomVoice"
-        }
+    With audio_sha256 (hash of the uploaded file), the embedding of a voice
+    already cloned from the same audio and transcript is reused instead of
+    cloning again, and concurrent uploads of it share one clone; each
+    request still gets a voice under its own name.
+
+    release_upload(), if given, is called once nothing reads the upload
+    any more - possibly after this returns or is cancelled, while a clone
+    other requests share still runs on it.
     """
+    source_hash = clone_source_hash(audio_sha256, transcript, language) if audio_sha256 else None
+    try:
+        embedding = None
+        if source_hash is not None:
+            loop = asyncio.get_event_loop()
+            existing = await loop.run_in_executor(
+                None, VoiceLibrary.catalog.find_by_source_hash, source_hash, name
+            )
+            if existing and existing["embedding_path"] and Path(existing["embedding_path"]).exists():
+                if existing["name"] == name:
+                    CLONE_DEDUP_HITS.inc()
+                    logger.info(f"Reusing voice {existing['voice_id']} cloned from the same audio and transcript")
+                    return VoiceInfo(**existing)
+                embedding = await VoiceLibrary.load_voice(existing["voice_id"])
+                if embedding is not None:
+                    CLONE_DEDUP_HITS.inc()
+                    logger.info(f"Reusing the embedding of voice {existing['voice_id']} for '{name}' (same audio and transcript)")
+
+        if embedding is None and source_hash is not None:
+            embedding, _ = await clone_flight.do(source_hash, _clone_embedding, audio_path, transcript, language)
+        elif embedding is None:
+            embedding = await _clone_embedding(audio_path, transcript, language)
+
+        return await _store_clone(embedding, filename, name, language, save_to_library, source_hash)
+    finally:
+        if release_upload is not None:
+            # A shared clone may still be reading this upload (if this request started it)
+            flight = clone_flight.running(source_hash) if source_hash is not None else None
+            if flight is not None:
+                flight.add_done_callback(lambda _: release_upload())
+            else:
+                release_upload()
+
+
+async def _clone_embedding(audio_path: str, transcript: str, language: str) -> np.ndarray:
+    """Compute a voice embedding from reference audio on disk"""
     start_time = time.time()
 
+    # Decode and resample the reference off the event loop (and out of this process)
+    reference_path = str(Path(audio_path).with_suffix(".reference.wav"))
     try:
-        # Synthesize
-        audio_array, sample_rate = await engine.synthesize(
-            text=request.text,
-            language=request.language,
-            voice=request.voice,
-            instruction=request.instruction,
-            model=request.model,
-            max_tokens=request.max_tokens,
-            temperature=request.temperature,
-            do_sample=request.do_sample,
+        duration = await audio_encoder.prepare_reference(audio_path, reference_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Clone voice
+        embedding = await engine.clone_voice(
+            audio_path=reference_path,
+            transcript=transcript,
+            language=language,
         )
+    finally:
+        Path(reference_path).unlink(missing_ok=True)
 
-        # Convert to WAV bytes
-        import io
-        buffer = io.BytesIO()
-        sf.write(buffer, audio_array, sample_rate, format='WAV')
-        buffer.seek(0)
-        audio_bytes = buffer.read()
+    latency = time.time() - start_time
+    logger.info(f"Cloned voice from {duration:.1f}s of audio in {latency:.2f}s")
+    return embedding
 
-        # Calculate duration
-        duration_ms = int((len(audio_array) / sample_rate) * 1000)
 
-        latency = time.time() - start_time
-        logger.info(
-            f"Synthesized: '{request.text[:50]}...' "
-            f"({request.language}, {request.voice or 'default'}) "
-            f"→ {len(audio_bytes)} bytes in {latency:.2f}s"
+async def _store_clone(
+    embedding: np.ndarray,
+    filename: Optional[str],
+    name: str,
+    language: str,
+    save_to_library: bool,
+    source_hash: Optional[str] = None,
+) -> VoiceInfo:
+    """The VoiceInfo for a cloned embedding, saved to the library if requested"""
+    # Generate voice ID
+    voice_id = f"voice_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+
+    # A recording of a voice already in the library (other than this one's own earlier clone)
+    duplicate = await VoiceLibrary.find_near_duplicate(embedding, exclude=(voice_id,))
+    if duplicate is not None:
+        CLONE_NEAR_DUPLICATES.inc()
+        logger.info(f"Clone '{name}' nearly matches voice {duplicate.voice_id}")
+
+    # Save to library
+    if save_to_library:
+        voice_info = await VoiceLibrary.save_voice(
+            voice_id=voice_id,
+            name=name,
+            language=language,
+            embedding=embedding,
+            description=f"Cloned from audio: {filename}",
+            source_hash=source_hash,
+        )
+    else:
+        voice_info = VoiceInfo(
+            voice_id=voice_id,
+            name=name,
+            language=language,
+            created_at=datetime.utcnow().isoformat(),
         )
 
-        return SynthesizeResponse(
-            audio=base64.b64encode(audio_bytes).decode(),
-            format="wav",
-            sample_rate=sample_rate,
-            duration_ms=duration_ms,
-            voice_id=request.voice,
-            model=request.model.value,
+    if duplicate is not None:
+        voice_info.near_duplicate_of = duplicate.voice_id
+
+    logger.info(f"Cloned voice: {name} ({voice_id})")
+    return voice_info
+
+
+async def design_voice_from_request(request: DesignVoiceRequest) -> VoiceInfo:
+    """Design a voice from a description and optionally save it"""
+    start_time = time.time()
+
+    # Design voice
+    embedding = await engine.design_voice(
+        description=request.description,
+        language=request.language,
+    )
+
+    # Generate voice ID
+    voice_id = f"voice_{hashlib.md5(request.name.encode()).hexdigest()[:8]}"
+
+    # Save to library
+    if request.save_to_library:
+        voice_info = await VoiceLibrary.save_voice(
+            voice_id=voice_id,
+            name=request.name,
+            language=request.language,
+            embedding=embedding,
+            description=request.description,
+        )
+    else:
+        voice_info = VoiceInfo(
+            voice_id=voice_id,
+            name=request.name,
+            language=request.language,
+            description=request.description,
+            created_at=datetime.utcnow().isoformat(),
         )
 
-    except Exception as e:
-        logger.error(f"Synthesis error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    latency = time.time() - start_time
+    logger.info(f"Designed voice: {request.name} ({voice_id}) in {latency:.2f}s")
+
+    return voice_info
 
 
 @app.post("/api/v1/clone-voice", response_model=VoiceInfo)
@@ -468,53 +4160,40 @@ async def clone_voice(
     Upload 5-30 seconds of audio with transcript
     """
     start_time = time.time()
+    status = "200"
 
     try:
-        # Save uploaded audio to temp file
+        # Stream the upload to a temp file, hashing it on the way
         import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
-
-        # Clone voice
-        embedding = await engine.clone_voice(
-            audio_path=temp_path,
+        import shutil
+        upload_dir = Path(tempfile.mkdtemp(prefix="qwentts-clone-"))
+        release_upload = functools.partial(shutil.rmtree, upload_dir, ignore_errors=True)
+        upload_path = upload_dir / "upload"
+        try:
+            audio_sha256 = await save_upload(audio, upload_path)
+        except BaseException:
+            release_upload()
+            raise
+        return await clone_voice_from_file(
+            audio_path=str(upload_path),
+            filename=audio.filename,
             transcript=transcript,
+            name=name,
             language=language,
+            save_to_library=save_to_library,
+            audio_sha256=audio_sha256,
+            release_upload=release_upload,
         )
 
-        # Generate voice ID
-        voice_id = f"voice_{hashlib.md5(name.encode()).hexdigest()[:8]}"
-
-        # Save to library
-        if save_to_library:
-            voice_info = await VoiceLibrary.save_voice(
-                voice_id=voice_id,
-                name=name,
-                language=language,
-                embedding=embedding,
-                description=f"Cloned from audio: {audio.filename}",
-            )
-        else:
-            voice_info = VoiceInfo(
-                voice_id=voice_id,
-                name=name,
-                language=language,
-                created_at=datetime.utcnow().isoformat(),
-            )
-
-        # Cleanup
-        os.unlink(temp_path)
-
-        latency = time.time() - start_time
-        logger.info(f"Cloned voice: {name} ({voice_id}) in {latency:.2f}s")
-
-        return voice_info
-
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
     except Exception as e:
+        status = "500"
         logger.error(f"Voice clone error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        record_request("clone_voice", "default", language, status, time.time() - start_time)
 
 
 @app.post("/api/v1/design-voice", response_model=VoiceInfo)
@@ -530,52 +4209,307 @@ async def design_voice(request: DesignVoiceRequest):
         }
     """
     start_time = time.time()
+    status = "200"
 
     try:
-        # Design voice
-        embedding = await engine.design_voice(
-            description=request.description,
-            language=request.language,
+        return await design_voice_from_request(request)
+
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except Exception as e:
+        status = "500"
+        logger.error(f"Voice design error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        record_request(
+            "design_voice", "default", request.language, status, time.time() - start_time
         )
 
-        # Generate voice ID
-        voice_id = f"voice_{hashlib.md5(request.name.encode()).hexdigest()[:8]}"
 
-        # Save to library
-        if request.save_to_library:
-            voice_info = await VoiceLibrary.save_voice(
-                voice_id=voice_id,
-                name=request.name,
-                language=request.language,
-                embedding=embedding,
-                description=request.description,
-            )
-        else:
-            voice_info = VoiceInfo(
-                voice_id=voice_id,
-                name=request.name,
-                language=request.language,
-                description=request.description,
-                created_at=datetime.utcnow().isoformat(),
-            )
+@app.post("/api/v1/jobs/synthesize", response_model=JobInfo, status_code=202)
+async def submit_synthesize_job(request: SynthesizeRequest):
+    """
+    Synthesize as a background job (for long texts)
+
+    Returns a job at once; poll GET /api/v1/jobs/{job_id} and fetch the
+    audio from GET /api/v1/jobs/{job_id}/audio when it has succeeded.
+    """
+    request = request.model_copy(update={
+        "streaming": False,
+        "priority": request.priority or Priority.BULK,
+    })
 
-        latency = time.time() - start_time
-        logger.info(f"Designed voice: {request.name} ({voice_id}) in {latency:.2f}s")
+    async def run(job_dir: Path) -> Dict[str, Any]:
+        resolved = engine.router.resolve(request)
+        rendered = await render_speech(resolved, endpoint="synthesize_job")
+        audio_path = job_dir / f"audio.{request.format.value}"
+        async with aiofiles.open(audio_path, "wb") as f:
+            await f.write(rendered.audio_bytes)
+        return {
+            "format": request.format.value,
+            "sample_rate": rendered.sample_rate,
+            "duration_ms": rendered.duration_ms,
+            "voice_id": request.voice,
+            "model": resolved.model.value,
+            "audio_bytes": len(rendered.audio_bytes),
+        }
 
-        return voice_info
+    return await jobs.submit("synthesize", run)
 
-    except Exception as e:
-        logger.error(f"Voice design error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/jobs/clone-voice", response_model=JobInfo, status_code=202)
+async def submit_clone_voice_job(
+    audio: UploadFile = File(...),
+    transcript: str = "",
+    name: str = "",
+    language: str = "en",
+    save_to_library: bool = True,
+):
+    """Clone a voice as a background job; the result is the VoiceInfo"""
+    import shutil
+    # Check before taking the upload; submit() checks again in case the queue filled meanwhile
+    jobs.check_capacity()
+    job_id = uuid.uuid4().hex
+    job_dir = jobs.job_dir(job_id)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    audio_path = job_dir / "upload"
+    filename = audio.filename
+
+    async def run(job_dir: Path) -> Dict[str, Any]:
+        voice_info = await clone_voice_from_file(
+            audio_path=str(audio_path),
+            filename=filename,
+            transcript=transcript,
+            name=name,
+            language=language,
+            save_to_library=save_to_library,
+            audio_sha256=audio_sha256,
+            release_upload=functools.partial(audio_path.unlink, missing_ok=True),
+        )
+        return voice_info.model_dump()
+
+    try:
+        # Keep the upload with the job so the HTTP request can end now
+        audio_sha256 = await save_upload(audio, audio_path)
+        return await jobs.submit("clone-voice", run, job_id=job_id)
+    except BaseException:
+        # A job that was never queued is never expired, so don't leave its directory behind
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+
+@app.post("/api/v1/jobs/design-voice", response_model=JobInfo, status_code=202)
+async def submit_design_voice_job(request: DesignVoiceRequest):
+    """Design a voice as a background job; the result is the VoiceInfo"""
+    async def run(job_dir: Path) -> Dict[str, Any]:
+        voice_info = await design_voice_from_request(request)
+        return voice_info.model_dump()
+
+    return await jobs.submit("design-voice", run)
+
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """
+    Get job status
+
+    With wait > 0, long-polls: returns as soon as the job finishes or after
+    wait seconds, whichever comes first.
+    """
+    job = await jobs.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.get("/api/v1/jobs/{job_id}/audio")
+async def get_job_audio(job_id: str):
+    """Download the audio produced by a finished synthesize job"""
+    job = jobs.get(job_id)
+    if job is None or job.kind != "synthesize":
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status.value}")
+
+    audio_format = AudioFormat(job.result["format"])
+    return FileResponse(
+        jobs.job_dir(job_id) / f"audio.{audio_format.value}",
+        media_type=AUDIO_FORMATS[audio_format][2],
+        headers={
+            "X-Duration-Ms": str(job.result["duration_ms"]),
+            "X-Sample-Rate": str(job.result["sample_rate"]),
+            "X-Model": job.result["model"],
+        },
+    )
+
+
+@app.get("/api/v1/calibration/max-tokens")
+async def get_token_calibration():
+    """
+    Learned tokens-per-character per model and language
+
+    budget_tokens_per_char is what a request without max_tokens is budgeted
+    (plus one second of frames, rounded up to a multiple of 64).
+    """
+    return {
+        "margin": TOKEN_BUDGET_MARGIN,
+        "std_margin": TOKEN_BUDGET_STD_MARGIN,
+        "min_tokens": TOKEN_BUDGET_MIN,
+        "max_tokens": TOKEN_BUDGET_MAX,
+        "rates": engine.token_budget.table(),
+    }
 
 
 @app.get("/api/v1/voices", response_model=List[VoiceInfo])
-async def list_voices():
-    """List all voices in the library"""
-    voices = await VoiceLibrary.list_voices()
+async def list_voices(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    language: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+):
+    """
+    List voices in the library
+
+    Supports pagination (limit/offset) and filtering by language and name
+    prefix. The total number of matching voices is returned in X-Total-Count.
+    """
+    voices = await VoiceLibrary.list_voices(
+        limit=limit,
+        offset=offset,
+        language=language,
+        name_prefix=name_prefix,
+    )
+    total = await VoiceLibrary.count_voices(language=language, name_prefix=name_prefix)
+    response.headers["X-Total-Count"] = str(total)
     return voices
 
 
+@app.get("/api/v1/voices/{voice_id}/similar", response_model=List[SimilarVoice])
+async def similar_voices(
+    voice_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    min_similarity: Optional[float] = Query(None, ge=-1.0, le=1.0),
+):
+    """
+    Voices most similar to this one (cosine similarity of their embeddings)
+
+    A similarity at or above VOICE_DUPLICATE_SIMILARITY marks a near-duplicate.
+    """
+    embedding = await VoiceLibrary.load_voice(voice_id)
+    if embedding is None:
+        raise HTTPException(status_code=404, detail=f"Voice {voice_id} not found")
+    matches = await VoiceLibrary.find_similar(embedding, limit, min_similarity, exclude=(voice_id,))
+    return [
+        SimilarVoice(
+            voice=voice,
+            similarity=similarity,
+            near_duplicate=VOICE_DUPLICATE_SIMILARITY > 0 and similarity >= VOICE_DUPLICATE_SIMILARITY,
+        )
+        for voice, similarity in matches
+    ]
+
+
+@app.post("/api/v1/voices/validate-precision")
+async def validate_embedding_precision(request: PrecisionValidationRequest):
+    """
+    Measure what quantized embedding storage does to the audio
+
+    For each voice stored at full precision, the text is synthesized with
+    its embedding as stored and with the embedding round-tripped through
+    each requested precision (same seed and token budget, no sampling).
+    Reports per voice and precision the storage size, embedding error, and
+    audio SNR and spectral distance against the full-precision rendering
+    (see compare_audio); run it before changing
+    VOICE_EMBEDDING_PRECISION. Voices already stored quantized are skipped.
+    """
+    model = engine.router.route() if request.model == QwenModel.AUTO else request.model
+    max_tokens = engine.token_budget.budget(model.value, request.language, request.text)
+
+    voice_ids = request.voice_ids
+    if voice_ids is None:
+        voice_ids, offset = [], 0
+        while len(voice_ids) < request.limit:
+            page = await VoiceLibrary.list_voices(limit=100, offset=offset)
+            for voice in page:
+                stored = await VoiceLibrary.load_stored(voice.voice_id)
+                if stored is not None and stored.precision == EmbeddingPrecision.FULL:
+                    voice_ids.append(voice.voice_id)
+            if len(page) < 100:
+                break
+            offset += 100
+        voice_ids = voice_ids[:request.limit]
+
+    async def render(voice_id: str, embedding: np.ndarray) -> np.ndarray:
+        audio_array, _ = await engine._synthesize(
+            request.text, request.language, voice_id, None, model, max_tokens,
+            0.7, False, 0, Priority.BULK, embedding=embedding,
+        )
+        return audio_array
+
+    voices = []
+    for voice_id in voice_ids:
+        stored = await VoiceLibrary.load_stored(voice_id)
+        if stored is None:
+            voices.append({"voice_id": voice_id, "status": "error", "error": f"Voice {voice_id} not found"})
+            continue
+        if stored.precision != EmbeddingPrecision.FULL:
+            voices.append({
+                "voice_id": voice_id, "status": "skipped",
+                "error": f"Stored at {stored.precision.value}; no full-precision reference",
+            })
+            continue
+
+        reference = stored.dequantize()
+        reference_vector = np.asarray(reference, dtype=np.float64).reshape(-1)
+        reference_audio = await render(voice_id, reference)
+
+        results = []
+        for precision in request.precisions:
+            quantized = StoredEmbedding.quantize(reference, precision)
+            vector = np.asarray(quantized.dequantize(), dtype=np.float64).reshape(-1)
+            audio = await render(voice_id, quantized.dequantize())
+            results.append({
+                "precision": precision.value,
+                "bytes": quantized.nbytes,
+                "compression": round(stored.nbytes / quantized.nbytes, 2),
+                "embedding_cosine": float(
+                    reference_vector @ vector
+                    / max(np.linalg.norm(reference_vector) * np.linalg.norm(vector), 1e-12)
+                ),
+                "embedding_max_abs_error": float(np.abs(reference_vector - vector).max()),
+                **compare_audio(reference_audio, audio),
+            })
+        voices.append({"voice_id": voice_id, "status": "ok", "bytes": stored.nbytes, "results": results})
+
+    summary = {}
+    for precision in request.precisions:
+        rows = [
+            result for voice in voices if voice["status"] == "ok"
+            for result in voice["results"] if result["precision"] == precision.value
+        ]
+        snrs = [row["audio_snr_db"] for row in rows if row["audio_snr_db"] is not None]
+        distances = [row["spectral_distance_db"] for row in rows if row["spectral_distance_db"] is not None]
+        summary[precision.value] = {
+            "voices": len(rows),
+            "identical_audio": len(rows) - len(snrs),
+            "min_snr_db": min(snrs) if snrs else None,
+            "mean_snr_db": round(float(np.mean(snrs)), 2) if snrs else None,
+            "max_spectral_distance_db": max(distances) if distances else None,
+            "compression": round(float(np.mean([row["compression"] for row in rows])), 2) if rows else None,
+        }
+
+    logger.info(f"Validated embedding precision on {len(voices)} voices: {summary}")
+    return {
+        "model": model.value,
+        "text": request.text,
+        "configured_precision": VoiceLibrary.precision.value,
+        "summary": summary,
+        "voices": voices,
+    }
+
+
 @app.delete("/api/v1/voices/{voice_id}")
 async def delete_voice(voice_id: str):
     """Delete a voice from the library"""
@@ -592,20 +4526,59 @@ async def delete_voice(voice_id: str):
 @app.on_event("startup")
 async def startup_event():
     logger.info("QwenTTS Bridge Service starting...")
-    logger.info(f"ComfyUI available: {COMFYUI_AVAILABLE}")
+    audio_encoder.start()
+    await jobs.start()
+    logger.info(f"TTS backend: {TTS_BACKEND} (available: {BACKEND_AVAILABLE})")
     logger.info(f"Voice library: {VOICE_LIBRARY_PATH}")
     logger.info(f"Model cache: {MODEL_CACHE_PATH}")
 
-    if not COMFYUI_AVAILABLE:
-        logger.warning("ComfyUI not available - running in mock mode")
+    if not BACKEND_AVAILABLE:
+        logger.warning(f"TTS backend '{TTS_BACKEND}' not available - running in mock mode")
+    elif TTS_BACKEND == "standin":
+        logger.warning("Using the stand-in backend - audio is synthetic, not speech")
+
+    warmup.start()
+
+    if VoiceLibrary.catalog.count() == 0 and any(
+        path.is_dir() for path in VOICE_LIBRARY_PATH.iterdir()
+    ):
+        logger.warning(
+            "Voice catalog is empty but the library has voices - "
+            "run `python main.py rebuild-voice-catalog` to import them"
+        )
+    if len(VoiceLibrary.embeddings) == 0 and VoiceLibrary.catalog.count() > 0:
+        logger.warning(
+            "Voice embedding matrix is empty but the catalog has voices - "
+            "run `python main.py rebuild-voice-embeddings` to index them"
+        )
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("QwenTTS Bridge Service shutting down...")
+    for pool in engine.pools.values():
+        pool.executor.shutdown(wait=False, cancel_futures=True)
+    audio_encoder.shutdown()
+    await jobs.stop()
+    await synthesis_cache.flush()
+    engine.token_budget.save()
 
 
 if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-voice-catalog":
+        # One-time import of existing per-directory metadata into the catalog
+        count = VoiceLibrary.catalog.rebuild(VOICE_LIBRARY_PATH)
+        print(f"Voice catalog rebuilt: {count} voices ({VOICE_CATALOG_PATH})")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-voice-embeddings":
+        # One-time import of existing per-directory embeddings into the matrix
+        count = VoiceLibrary.embeddings.rebuild(VOICE_LIBRARY_PATH)
+        print(f"Voice embedding matrix rebuilt: {count} voices ({VOICE_MATRIX_PATH})")
+        sys.exit(0)
+
     import uvicorn
     uvicorn.run(
         app,
@@ -0,0 +1,196 @@
+"""
+Deterministic stand-in for the ComfyUI-QwenTTS nodes
+
+Select with TTS_BACKEND=standin to run the bridge end-to-end without
+ComfyUI, torch or a GPU - for load testing the HTTP, caching and
+scheduling layers, and for reproducing concurrency bugs locally.
+
+The nodes have the same methods and return shapes as the real ones
+(generate -> {"audio", "sample_rate"}, create_voice / design_voice ->
+{"embedding"}) and, like them, take one text per call and are serialized
+by the bridge unless STANDIN_THREAD_SAFE is set. Audio is a synthetic voiced signal whose
+length follows the text like Qwen3-TTS-12Hz output (12 codec tokens per
+second of speech, capped by max_new_tokens). The same inputs always give
+the same samples, even with do_sample and no seed. A voice_embedding input
+sets the pitch through a smooth function of the embedding, so nearby
+embeddings (e.g. quantized copies) give nearby audio.
+
+Timing and memory are configurable:
+    STANDIN_TOKEN_LATENCY_MS    Compute time per generated token, in ms
+    STANDIN_SMALL_MODEL_SPEEDUP How much faster 0.6B models decode than 1.7B ones
+    STANDIN_LOAD_SECONDS        Model load time
+    STANDIN_MODEL_MEMORY_MB     Memory held while a model is loaded
+    STANDIN_ACTIVATION_MB       Transient memory per item during generation
+    STANDIN_THREAD_SAFE         Declare the nodes THREAD_SAFE, so NODE_CONCURRENCY
+                                applies (default false, like the ComfyUI nodes)
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+TOKENS_PER_SECOND = 12  # Qwen3-TTS-12Hz codec frame rate
+SAMPLE_RATE = 24000
+EMBEDDING_DIM = 1024
+
+TOKEN_LATENCY_MS = float(os.getenv("STANDIN_TOKEN_LATENCY_MS", "5"))
+SMALL_MODEL_SPEEDUP = float(os.getenv("STANDIN_SMALL_MODEL_SPEEDUP", "2.5"))
+LOAD_SECONDS = float(os.getenv("STANDIN_LOAD_SECONDS", "0"))
+MODEL_MEMORY_MB = int(os.getenv("STANDIN_MODEL_MEMORY_MB", "0"))
+ACTIVATION_MB = int(os.getenv("STANDIN_ACTIVATION_MB", "0"))
+NODES_THREAD_SAFE = os.getenv("STANDIN_THREAD_SAFE", "false").lower() == "true"
+
+# Speaking rate: characters of text per second of speech
+LATIN_CHARS_PER_SECOND = 15.0
+CJK_CHARS_PER_SECOND = 5.0
+
+
+def _seed_for(*parts: Any) -> int:
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.sha256(canonical.encode("utf-8")).digest()[:8], "little")
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x3040 <= code <= 0x30FF      # Hiragana, Katakana
+        or 0x3400 <= code <= 0x9FFF   # CJK ideographs
+        or 0xAC00 <= code <= 0xD7AF   # Hangul syllables
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Codec tokens a real model would generate for this text"""
+    cjk = sum(1 for char in text if _is_cjk(char))
+    seconds = cjk / CJK_CHARS_PER_SECOND + (len(text) - cjk) / LATIN_CHARS_PER_SECOND
+    return max(1, int(np.ceil(seconds * TOKENS_PER_SECOND)))
+
+
+def synthetic_speech(
+    num_tokens: int,
+    seed: int,
+    sample_rate: int = SAMPLE_RATE,
+    base_f0: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Speech-like float32 audio: a harmonic voice with a wandering pitch,
+    syllable-rate amplitude envelope and short pauses
+    """
+    rng = np.random.default_rng(seed)
+    length = int(max(1, num_tokens) * sample_rate / TOKENS_PER_SECOND)
+    t = np.arange(length, dtype=np.float32) / sample_rate
+
+    # Pitch: a per-voice base frequency with slow intonation drift (always
+    # drawn, so an override leaves the rest of the random sequence unchanged)
+    drawn_f0 = rng.uniform(95, 240)
+    base_f0 = drawn_f0 if base_f0 is None else base_f0
+    drift = np.interp(t, np.linspace(0, t[-1], 8), rng.uniform(-0.12, 0.12, 8))
+    phase = 2 * np.pi * np.cumsum(base_f0 * (1 + drift)) / sample_rate
+
+    voice = np.zeros(length, dtype=np.float32)
+    for harmonic, weight in enumerate((1.0, 0.5, 0.3, 0.15), start=1):
+        voice += weight * np.sin(harmonic * phase).astype(np.float32)
+
+    # Syllables at ~4 Hz; about a third of the seconds are pauses
+    syllable_rate = rng.uniform(3.5, 5.0)
+    envelope = np.sqrt(np.clip(np.sin(2 * np.pi * syllable_rate * t), 0, None))
+    second = t.astype(int)
+    envelope[rng.random(second[-1] + 1)[second] < 0.3] = 0
+
+    audio = 0.2 * voice * envelope + rng.normal(0, 0.002, length)
+    return audio.astype(np.float32)
+
+
+class _StandInNode:
+    """Shared load/unload and timing behaviour"""
+
+    # Calls share no mutable state, but by default the bridge serializes them as it
+    # does the ComfyUI nodes; opted in, it runs NODE_CONCURRENCY of them at once
+    THREAD_SAFE = NODES_THREAD_SAFE
+
+    def __init__(self):
+        self.model_name: Optional[str] = None
+        self._weights: Optional[np.ndarray] = None
+        self._token_latency = TOKEN_LATENCY_MS / 1000
+
+    def load_model(self, model_name: str):
+        time.sleep(LOAD_SECONDS)
+        self.model_name = model_name
+        if "0.6B" in model_name:
+            self._token_latency = TOKEN_LATENCY_MS / 1000 / SMALL_MODEL_SPEEDUP
+        if MODEL_MEMORY_MB > 0:
+            # ones (not zeros) so the pages are actually resident
+            self._weights = np.ones(MODEL_MEMORY_MB * 1024 * 1024, dtype=np.uint8)
+
+    def unload_model(self):
+        self._weights = None
+
+    def _compute(self, num_tokens: int):
+        """Hold the thread for as long as the real decode would take"""
+        activations = None
+        if ACTIVATION_MB > 0:
+            activations = np.ones(ACTIVATION_MB * 1024 * 1024, dtype=np.uint8)
+        time.sleep(num_tokens * self._token_latency)
+        del activations
+
+    def _embedding(self, *parts: Any) -> Dict[str, Any]:
+        rng = np.random.default_rng(_seed_for(*parts))
+        embedding = rng.normal(0, 1, EMBEDDING_DIM).astype(np.float32)
+        return {"embedding": embedding / np.linalg.norm(embedding)}
+
+
+def embedding_pitch(embedding: np.ndarray) -> float:
+    """Base pitch (95-240 Hz) as a smooth function of a voice embedding"""
+    vector = np.asarray(embedding, dtype=np.float64).reshape(-1)
+    direction = np.random.default_rng(len(vector)).normal(0, 1, len(vector))
+    projection = vector @ direction / (np.linalg.norm(vector) * np.linalg.norm(direction) or 1.0)
+    return 167.5 + 72.5 * np.tanh(projection * 30)
+
+
+class StandInTTS(_StandInNode):
+    """Stand-in for the CustomVoice / VoiceClone generation nodes"""
+
+    def _tokens_for(self, inputs: Dict[str, Any]) -> int:
+        return min(estimate_tokens(inputs["text"]), int(inputs.get("max_new_tokens", 1024)))
+
+    def _render(self, inputs: Dict[str, Any], num_tokens: int) -> Dict[str, Any]:
+        # The voice (speaker / instruction) decides the timbre; text and seed the rest
+        voice_seed = _seed_for(self.model_name, inputs.get("speaker"), inputs.get("instruction"))
+        embedding = inputs.get("voice_embedding")
+        audio = synthetic_speech(
+            num_tokens,
+            voice_seed ^ _seed_for(inputs["text"], inputs.get("seed")),
+            base_f0=embedding_pitch(embedding) if embedding is not None else None,
+        )
+        return {"audio": audio, "sample_rate": SAMPLE_RATE}
+
+    def generate(self, **inputs) -> Dict[str, Any]:
+        num_tokens = self._tokens_for(inputs)
+        self._compute(num_tokens)
+        return self._render(inputs, num_tokens)
+
+    def create_voice(self, audio_path: str, transcript: str, language: str = "en") -> Dict[str, Any]:
+        with open(audio_path, "rb") as f:
+            audio_hash = hashlib.sha256(f.read()).hexdigest()
+        self._compute(TOKENS_PER_SECOND * 2)
+        return self._embedding("clone", audio_hash, transcript, language)
+
+
+class StandInVoiceDesign(_StandInNode):
+    """Stand-in for the VoiceDesign node"""
+
+    def design_voice(self, description: str, language: str = "en") -> Dict[str, Any]:
+        self._compute(TOKENS_PER_SECOND * 2)
+        return self._embedding("design", description, language)
+
+
+# Same node names as ComfyUI-QwenTTS registers
+NODE_CLASS_MAPPINGS = {
+    'AILab_QwenTTS': StandInTTS,
+    'AILab_QwenTTS_VoiceDesign': StandInVoiceDesign,
+    'AILab_QwenTTS_VoiceClone': StandInTTS,
+}